@@ -0,0 +1,16 @@
+"""
+Times importing the metrics package with and without matplotlib, in a fresh interpreter each.
+
+    python -m benchmarks.evaluator_import
+"""
+import subprocess
+import sys
+
+if __name__ == "__main__":
+    # import time of each module, best of 5
+    script = "import time; start = time.time(); import {}; print(time.time() - start)"
+    for module in ("unet.object_detection_metrics.Evaluator", "unet.object_detection_metrics.plotting",
+                   "matplotlib.pyplot"):
+        times = [float(subprocess.check_output([sys.executable, "-c", script.format(module)]))
+                 for _ in range(5)]
+        print("import {}: {:.0f} ms".format(module, min(times) * 1000))
@@ -0,0 +1,30 @@
+"""
+Times the streaming PAGE parser against the minidom reader on a folder of IMPACT annotations.
+
+    python -m benchmarks.impact ../data/impact --workers 4
+"""
+import argparse
+import os
+import time
+
+from benchmarks.reference import read_xml_dom
+from utils.impact import read_directory, read_xml
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Speed of streaming PAGE parser against DOM parser")
+    parser.add_argument("path", nargs="?", default="../data/impact", help="folder with PAGE xml files")
+    parser.add_argument("--workers", type=int, default=None, help="processes of batch mode")
+    args = parser.parse_args()
+
+    files = [os.path.join(args.path, file) for file in sorted(os.listdir(args.path)) if file.endswith(".xml")]
+    timings = {}
+    for name, read in (("minidom", read_xml_dom), ("iterparse", read_xml)):
+        start = time.time()
+        for file in files:
+            read(file)
+        timings[name] = time.time() - start
+    start = time.time()
+    read_directory(args.path, workers=args.workers)
+    timings["iterparse, process pool"] = time.time() - start
+    for name, elapsed in timings.items():
+        print("{}: {:.2f} ms per page".format(name, elapsed / max(len(files), 1) * 1000))
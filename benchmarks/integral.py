@@ -0,0 +1,27 @@
+"""
+Times projection profiles of 200 regions from an integral image against resizing every region.
+
+    python -m benchmarks.integral
+"""
+import time
+
+import cv2
+import numpy as np
+
+from utils.integral import integral_image, projection_profiles
+
+if __name__ == "__main__":
+    rng = np.random.RandomState(0)
+    page = rng.rand(1024, 736) * (rng.rand(1024, 736) > 0.7)
+    rectangles = np.stack([rng.randint(0, 600, 200), rng.randint(0, 900, 200),
+                           rng.randint(5, 130, 200), rng.randint(5, 120, 200)], axis=1)
+
+    start = time.time()
+    for x, y, w, h in rectangles:
+        patch = cv2.resize(page[y:y + h, x:x + w], (100, 100))
+        patch.sum(0), patch.sum(1)
+    print("resize: {:.2f} ms".format((time.time() - start) * 1000))
+
+    start = time.time()
+    projection_profiles(integral_image(page), rectangles)
+    print("integral: {:.2f} ms".format((time.time() - start) * 1000))
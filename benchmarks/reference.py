@@ -0,0 +1,117 @@
+"""
+Earlier implementations replaced by faster ones and random data, shared by benchmarks and tests.
+"""
+from pathlib import Path
+from xml.dom.minidom import parse
+
+import cv2
+import numpy as np
+
+from unet.object_detection_metrics.BoundingBox import BoundingBox
+from unet.object_detection_metrics.BoundingBoxes import BoundingBoxes
+from unet.object_detection_metrics.utils import BBType
+from utils.image import Region
+
+
+def random_boxes(random, images=40, classes=4, gts=800, dets=1600):
+    boxes = BoundingBoxes()
+    gt_rects = []
+    for _ in range(gts):
+        image, class_id = str(random.randint(images)), random.randint(classes)
+        x, y, w, h = random.randint(0, 500, 2).tolist() + random.randint(5, 120, 2).tolist()
+        gt_rects.append((image, class_id, x, y, w, h))
+        boxes.addBoundingBox(BoundingBox(image, class_id, x, y, w, h, bbType=BBType.GroundTruth))
+    for _ in range(dets):
+        if gt_rects and random.rand() < 0.7:
+            # jittered ground truth, sometimes with wrong class
+            image, class_id, x, y, w, h = gt_rects[random.randint(len(gt_rects))]
+            x, y, w, h = [max(1, v + random.randint(-15, 16)) for v in (x, y, w, h)]
+            if random.rand() < 0.1:
+                class_id = random.randint(classes + 1)
+        else:
+            image, class_id = str(random.randint(images + 5)), random.randint(classes + 1)
+            x, y, w, h = random.randint(0, 500, 2).tolist() + random.randint(5, 120, 2).tolist()
+        # rounded confidences give ties
+        confidence = round(random.rand(), 2)
+        boxes.addBoundingBox(BoundingBox(image, class_id, x, y, w, h, bbType=BBType.Detected,
+                                         classConfidence=confidence))
+    return boxes
+
+
+def semisuper_contour_gt_loop(img):
+    # implementation before vectorization, fails on blank patches
+    mask = img != 255
+    coords = np.argwhere(mask)
+    indeces = np.unique(coords[:, 0], return_index=True)[1]
+    bounds1 = coords[indeces]
+    bounds2 = coords[np.roll(indeces - 1, -1)][::-1]
+    bounds1[:, [1, 0]] = bounds1[:, [0, 1]]
+    bounds2[:, [1, 0]] = bounds2[:, [0, 1]]
+    hull = cv2.convexHull(np.concatenate((bounds1, bounds2)))
+    mask = np.zeros_like(mask, dtype=np.uint8)
+    cv2.drawContours(mask, [hull], -1, (1), -1)
+    return mask
+
+
+def semisuper_page_mask_loop(grey, boxes, class_ids):
+    mask = np.zeros_like(grey, dtype=np.int32)
+    for (x0, y0, x1, y1), class_id in zip(boxes, class_ids):
+        img_patch = grey[y0:y1, x0:x1]
+        if (img_patch == 255).all():
+            semi_mask = np.zeros_like(img_patch, dtype=np.int32)
+        else:
+            semi_mask = semisuper_contour_gt_loop(img_patch).astype(np.int32)
+        semi_mask[semi_mask > 0.5] = class_id
+        mask[y0:y1, x0:x1] = semi_mask
+    return mask
+
+
+def random_page():
+    # synthetic 736x1024 page with 40 regions
+    random = np.random.RandomState(0)
+    grey = np.full((1024, 736), 255, dtype=np.uint8)
+    for _ in range(400):
+        x, y = random.randint(0, 700), random.randint(0, 1000)
+        grey[y:y + random.randint(1, 12), x:x + random.randint(1, 200)] = random.randint(0, 200)
+    boxes = []
+    for _ in range(40):
+        x, y = random.randint(0, 650), random.randint(0, 950)
+        boxes.append((x, y, x + random.randint(5, 300), y + random.randint(5, 200)))
+    return grey, boxes, random.randint(1, 5, len(boxes))
+
+
+def find_regions_dom(dom, tag_class):
+    # DOM implementation before the streaming parser
+    regions = []
+    region_tags = dom.getElementsByTagName(tag_class.capitalize() + "Region")
+
+    for region_tag in region_tags:
+        if region_tag.hasAttribute("type"):
+            region_type = region_tag.getAttribute("type")
+        else:
+            region_type = tag_class
+
+        point_tags = region_tag.getElementsByTagName("Point")
+        countour = []
+        for point_tag in point_tags:
+            countour.append((point_tag.getAttribute("x"), point_tag.getAttribute("y")))
+        regions.append(Region(tag_class, region_type, np.array(countour, int)))
+    return regions
+
+
+def read_xml_dom(file):
+    # DOM implementation before the streaming parser
+    file = Path(file)
+    dom = parse(str(file))
+    page = dom.getElementsByTagName("Page")[0]
+    image_path = str(file.parent / page.getAttribute('imageFilename'))
+    size = None
+    if page.hasAttribute("imageWidth") and page.hasAttribute("imageHeight"):
+        size = int(page.getAttribute("imageWidth")), int(page.getAttribute("imageHeight"))
+
+    regions = []
+    regions += find_regions_dom(dom, Region.TEXT)
+    regions += find_regions_dom(dom, Region.IMAGE)
+    regions += find_regions_dom(dom, Region.SEPARATOR)
+    regions += find_regions_dom(dom, Region.GRAPHIC)
+    return image_path, size, regions
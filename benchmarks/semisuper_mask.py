@@ -0,0 +1,17 @@
+"""
+Times `semisuper_page_mask` against the per-region loop on a synthetic page.
+
+    python -m benchmarks.semisuper_mask
+"""
+import time
+
+from benchmarks.reference import random_page, semisuper_page_mask_loop
+from unet.datasets import semisuper_page_mask
+
+if __name__ == "__main__":
+    grey, boxes, class_ids = random_page()
+    for name, f in (("per-region loop", semisuper_page_mask_loop), ("semisuper_page_mask", semisuper_page_mask)):
+        start = time.time()
+        for _ in range(20):
+            f(grey, boxes, class_ids)
+        print("{}: {:.2f} ms per page".format(name, (time.time() - start) / 20 * 1000))
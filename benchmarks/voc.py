@@ -0,0 +1,34 @@
+"""
+Times `Evaluator.GetPascalVOCMetrics` against the vectorized evaluators.
+
+    python -m benchmarks.voc
+"""
+import time
+import warnings
+
+import numpy as np
+
+from benchmarks.reference import random_boxes
+from unet.object_detection_metrics.Evaluator import Evaluator
+from unet.object_detection_metrics.voc import (COCO_THRESHOLDS, coco_metrics, coco_summary, pascal_voc_metrics,
+                                               voc_metrics)
+
+
+def timed(name, f):
+    start = time.time()
+    f()
+    print("{}: {:.3f} s".format(name, time.time() - start))
+
+
+if __name__ == "__main__":
+    warnings.simplefilter("ignore", RuntimeWarning)
+    boxes = random_boxes(np.random.RandomState(0), images=200, gts=8000, dets=16000)
+    columns = boxes.arrays()
+    timed("Evaluator", lambda: Evaluator().GetPascalVOCMetrics(boxes))
+    timed("pascal_voc_metrics", lambda: pascal_voc_metrics(boxes))
+    timed("voc_metrics", lambda: voc_metrics(*columns))
+    timed("voc_metrics for 10 thresholds",
+          lambda: [voc_metrics(*columns, iou_threshold=t) for t in COCO_THRESHOLDS])
+    timed("coco_metrics", lambda: coco_summary(coco_metrics(*columns)))
+    area_ranges = {"all": (0, np.inf), "small": (0, 32 ** 2), "medium": (32 ** 2, 96 ** 2), "large": (96 ** 2, np.inf)}
+    timed("coco_metrics with 4 area ranges", lambda: coco_summary(coco_metrics(*columns, area_ranges=area_ranges)))
@@ -0,0 +1 @@
+# makes `unet`, `utils` and `benchmarks` importable from tests/ when running `pytest` from the repository root
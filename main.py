@@ -24,7 +24,10 @@ def main():
     with open(os.path.join(exp_path, "config.yml"), "w") as f:
         yaml.dump(config, f)
     trainer = Trainer(exp_path, config, device=DEVICE)
-    trainer.train()
+    try:
+        trainer.train()
+    finally:
+        trainer.close()
 
 
 if __name__ == '__main__':
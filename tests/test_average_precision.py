@@ -0,0 +1,85 @@
+import numpy as np
+import pytest
+
+from unet.object_detection_metrics.average_precision import eleven_point_ap, every_point_ap
+
+
+def every_point_ap_loop(rec, prec):
+    # original `Evaluator.CalculateAveragePrecision`, implementation before vectorization
+    mrec = []
+    mrec.append(0)
+    [mrec.append(e) for e in rec]
+    mrec.append(1)
+    mpre = []
+    mpre.append(0)
+    [mpre.append(e) for e in prec]
+    mpre.append(0)
+    for i in range(len(mpre) - 1, 0, -1):
+        mpre[i - 1] = max(mpre[i - 1], mpre[i])
+    ii = []
+    for i in range(len(mrec) - 1):
+        if mrec[1:][i] != mrec[0:-1][i]:
+            ii.append(i + 1)
+    ap = 0
+    for i in ii:
+        ap = ap + np.sum((mrec[i] - mrec[i - 1]) * mpre[i])
+    return [ap, mpre[0:len(mpre) - 1], mrec[0:len(mpre) - 1], ii]
+
+
+def eleven_point_ap_loop(rec, prec):
+    # original `Evaluator.ElevenPointInterpolatedAP`, implementation before vectorization
+    mrec = []
+    [mrec.append(e) for e in rec]
+    mpre = []
+    [mpre.append(e) for e in prec]
+    recallValues = np.linspace(0, 1, 11)
+    recallValues = list(recallValues[::-1])
+    rhoInterp = []
+    recallValid = []
+    for r in recallValues:
+        argGreaterRecalls = np.argwhere(mrec[:] >= r)
+        pmax = 0
+        if argGreaterRecalls.size != 0:
+            pmax = max(mpre[argGreaterRecalls.min():])
+        recallValid.append(r)
+        rhoInterp.append(pmax)
+    ap = sum(rhoInterp) / 11
+    rvals = []
+    rvals.append(recallValid[0])
+    [rvals.append(e) for e in recallValid]
+    rvals.append(0)
+    pvals = []
+    pvals.append(0)
+    [pvals.append(e) for e in rhoInterp]
+    pvals.append(0)
+    cc = []
+    for i in range(len(rvals)):
+        p = (rvals[i], pvals[i - 1])
+        if p not in cc:
+            cc.append(p)
+        p = (rvals[i], pvals[i])
+        if p not in cc:
+            cc.append(p)
+    recallValues = [i[0] for i in cc]
+    rhoInterp = [i[1] for i in cc]
+    return [ap, rhoInterp, recallValues, None]
+
+
+def same(a, b):
+    assert len(a) == len(b)
+    for x, y in zip(a, b):
+        assert np.array_equal(np.asarray(x, dtype=float), np.asarray(y, dtype=float), equal_nan=True), (x, y)
+
+
+@pytest.mark.filterwarnings("ignore::RuntimeWarning")
+def test_average_precision_parity():
+    random = np.random.RandomState(0)
+    for _ in range(300):
+        TP = (random.rand(random.randint(0, 300)) < random.rand()).astype(float)
+        npos = random.randint(0, 100)
+        acc_TP = np.cumsum(TP)
+        acc_FP = np.cumsum(1 - TP)
+        rec = acc_TP / npos
+        prec = np.divide(acc_TP, (acc_FP + acc_TP))
+        same(every_point_ap_loop(rec, prec), every_point_ap(rec, prec))
+        same(eleven_point_ap_loop(rec, prec), eleven_point_ap(rec, prec))
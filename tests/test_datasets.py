@@ -0,0 +1,71 @@
+import cv2
+import numpy as np
+import pytest
+
+from benchmarks.reference import random_page, semisuper_contour_gt_loop, semisuper_page_mask_loop
+from unet.datasets import RecordDataset, semisuper_contour_gt, semisuper_page_mask
+from utils.tfrecords import (TFRecordWriter, bytes_feature, bytes_list_feature, example, float_list_feature,
+                             int64_feature, int64_list_feature)
+
+
+def test_semisuper_contour_gt_empty_patch():
+    for shape in ((30, 0), (0, 30), (0, 0)):
+        mask = semisuper_contour_gt(np.zeros(shape, dtype=np.uint8))
+        assert mask.shape == shape
+
+
+def test_semisuper_contour_gt_blank_patch():
+    assert not semisuper_contour_gt(np.full((20, 30), 255, dtype=np.uint8)).any()
+
+
+def test_semisuper_page_mask_thin_region():
+    # thin vertical separator truncated to zero width after scaling
+    grey = np.full((100, 80), 255, dtype=np.uint8)
+    grey[10:90, 40] = 0
+    mask = semisuper_page_mask(grey, [(40, 10, 40, 90), (10, 10, 60, 50)], [3, 1])
+    assert mask.shape == grey.shape
+    assert (mask[10:50, 40] == 1).all()
+
+
+@pytest.fixture
+def page():
+    return random_page()
+
+
+def test_semisuper_contour_gt_parity(page):
+    grey, boxes, _ = page
+    for x0, y0, x1, y1 in boxes:
+        img_patch = grey[y0:y1, x0:x1]
+        if not (img_patch == 255).all():
+            assert (semisuper_contour_gt(img_patch) == semisuper_contour_gt_loop(img_patch)).all()
+
+
+def test_semisuper_page_mask_parity(page):
+    grey, boxes, class_ids = page
+    assert (semisuper_page_mask(grey, boxes, class_ids) == semisuper_page_mask_loop(grey, boxes, class_ids)).all()
+
+
+def test_record_dataset_zero_width_box(tmp_path):
+    grey = np.full((100, 80), 255, dtype=np.uint8)
+    grey[10:90, 40] = 0
+    grey[20:30, 10:60] = 0
+    encoded = cv2.imencode(".png", grey)[1].tobytes()
+    features = {
+        "image/width": int64_feature(80),
+        "image/height": int64_feature(100),
+        "image/encoded": bytes_feature(encoded),
+        "image/object/bbox/xmin": float_list_feature([0.5, 0.125]),
+        "image/object/bbox/xmax": float_list_feature([0.5, 0.75]),
+        "image/object/bbox/ymin": float_list_feature([0.1, 0.2]),
+        "image/object/bbox/ymax": float_list_feature([0.9, 0.3]),
+        "image/object/class/text": bytes_list_feature([b"separator", b"text"]),
+        "image/object/class/label": int64_list_feature([3, 1]),
+    }
+    path = str(tmp_path / "data.record")
+    with TFRecordWriter(path) as writer:
+        writer.write(example(features))
+
+    dataset = RecordDataset([path], size=(80, 100))
+    (grey, mask, mask_with_class), = list(dataset)
+    assert mask_with_class.shape == (100, 80)
+    assert set(np.unique(mask_with_class.numpy())) == {0, 1}
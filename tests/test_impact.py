@@ -0,0 +1,51 @@
+import numpy as np
+
+from benchmarks.reference import read_xml_dom
+from utils.impact import read_xml
+from utils.index import IMPACT, read_annotation
+
+PAGE = """<?xml version="1.0" encoding="UTF-8"?>
+<PcGts xmlns="http://schema.primaresearch.org/PAGE/gts/pagecontent/2010-03-19">
+  <Page imageFilename="page.png" imageWidth="800" imageHeight="1000">
+    <TextRegion id="r1" type="heading">
+      <Coords><Point x="10" y="10"/><Point x="200" y="10"/><Point x="200" y="40"/><Point x="10" y="40"/></Coords>
+      <TextLine id="l1">
+        <Coords><Point x="12" y="12"/><Point x="190" y="38"/></Coords>
+      </TextLine>
+    </TextRegion>
+    <SeparatorRegion id="r2" type="separator">
+      <Coords><Point x="10" y="50"/><Point x="700" y="52"/></Coords>
+    </SeparatorRegion>
+    <ImageRegion id="r3">
+      <Coords><Point x="300" y="300"/><Point x="500" y="300"/><Point x="500" y="600"/></Coords>
+    </ImageRegion>
+    <TextRegion id="r4" type="paragraph">
+      <Coords><Point x="10" y="60"/><Point x="700" y="60"/><Point x="700" y="290"/></Coords>
+    </TextRegion>
+    <GraphicRegion id="r5" type="other">
+      <Coords><Point x="600" y="700"/><Point x="650" y="750"/></Coords>
+    </GraphicRegion>
+  </Page>
+</PcGts>
+"""
+
+
+def test_read_xml_parity(tmp_path):
+    file = tmp_path / "page.xml"
+    file.write_text(PAGE)
+    path, size, regions = read_xml(file)
+    path_ref, size_ref, regions_ref = read_xml_dom(file)
+    assert path == path_ref and size == size_ref == (800, 1000)
+    assert len(regions) == len(regions_ref) == 5
+    for region, region_ref in zip(regions, regions_ref):
+        assert region.category == region_ref.category and region.subcategory == region_ref.subcategory
+        assert np.array_equal(region.contour, region_ref.contour)
+
+
+def test_read_xml_unknown_types(tmp_path):
+    file = tmp_path / "page.xml"
+    file.write_text(PAGE.replace('type="heading"', 'type="drop-capital"')
+                        .replace('<GraphicRegion id="r5" type="other">', '<GraphicRegion id="r5" type="stamp">')
+                        .replace('<TextRegion id="r4" type="paragraph">', '<TextRegion id="r4">'))
+    path, size, regions = read_annotation(IMPACT, file)
+    assert [region.subcategory for region in regions] == ["image/image", "separator/separator"]
@@ -0,0 +1,56 @@
+import os
+
+import numpy as np
+
+from utils.index import IMPACT, LABELIMG, SUPERVISELY, build_index, open_index, parse_sources, source_entry
+
+ANNOTATION = """<annotation><filename>{name}.jpg</filename>
+<size><width>800</width><height>1000</height></size>
+<object><name>paragraph</name><bndbox><xmin>{x}</xmin><ymin>50</ymin><xmax>300</xmax><ymax>200</ymax></bndbox></object>
+<object><name>maths</name><bndbox><xmin>60</xmin><ymin>500</ymin><xmax>200</xmax><ymax>560</ymax></bndbox></object>
+</annotation>"""
+
+
+def write_annotation(folder, name, x, mtime=None):
+    path = os.path.join(str(folder), name + ".xml")
+    with open(path, "w") as f:
+        f.write(ANNOTATION.format(name=name, x=x))
+    if mtime is not None:
+        os.utime(path, (mtime, mtime))
+    return path
+
+
+def test_open_index_rereads_changed_annotations(tmp_path):
+    folder = tmp_path / "labelImg"
+    folder.mkdir()
+    first = write_annotation(folder, "a", 40, mtime=1000)
+    second = write_annotation(folder, "b", 40, mtime=1000)
+    index_path = str(tmp_path / "index.npz")
+    sources = [(LABELIMG, str(folder))]
+    index = open_index(index_path, sources)
+    assert sorted(index["x"].tolist()) == [40, 40, 60, 60]
+
+    write_annotation(folder, "a", 10, mtime=2000)
+    third = write_annotation(folder, "c", 20, mtime=2000)
+    os.remove(second)
+    index = open_index(index_path, sources)
+    assert sorted(index["annotation"].tolist()) == [first, third]
+    assert [region.contour[0, 0] for region in index.regions(index.page(first))] == [10, 60]
+    assert [region.contour[0, 0] for region in index.regions(index.page(third))] == [20, 60]
+    assert index["mtime"][index.page(first)] == 2000
+
+    # refreshed index is saved and equal to a fresh build
+    reopened = open_index(index_path, sources)
+    rebuilt = build_index(sources)
+    assert sorted(reopened["annotation"].tolist()) == sorted(rebuilt["annotation"].tolist())
+    for file in rebuilt["annotation"].tolist():
+        regions = reopened.regions(reopened.page(file))
+        expected = rebuilt.regions(rebuilt.page(file))
+        assert [region.subcategory for region in regions] == [region.subcategory for region in expected]
+        assert all(np.array_equal(region.contour, other.contour) for region, other in zip(regions, expected))
+
+
+def test_source_entry():
+    entries = [source_entry(arg) for arg in ("_data/zbirnyk", "impact:_data/impact", "labelImg:C:/labelImg")]
+    assert parse_sources(entries) == [(SUPERVISELY, "_data/zbirnyk"), (IMPACT, "_data/impact"),
+                                      (LABELIMG, "C:/labelImg")]
@@ -0,0 +1,37 @@
+import cv2
+import numpy as np
+import pytest
+
+from utils.integral import integral_image, projection_profiles
+
+
+def resize_profiles(patch, bins):
+    # profiles of the region resized by area averaging
+    patch = cv2.resize(patch, (bins, bins), interpolation=cv2.INTER_AREA)
+    return patch.sum(0), patch.sum(1)
+
+
+@pytest.fixture
+def page():
+    random = np.random.RandomState(0)
+    return random.rand(1024, 736) * (random.rand(1024, 736) > 0.7)
+
+
+def test_projection_profiles_resize_parity(page):
+    # sizes divisible by `bins`, area averaging is then the exact mean of pixel blocks
+    bins = 20
+    rectangles = np.array([(0, 0, 20, 20), (13, 57, 200, 40), (300, 500, 60, 380), (716, 1004, 20, 20)])
+    x_projections, y_projections = projection_profiles(integral_image(page), rectangles, bins=bins)
+    for (x, y, w, h), x_projection, y_projection in zip(rectangles, x_projections, y_projections):
+        x_reference, y_reference = resize_profiles(page[y:y + h, x:x + w], bins)
+        assert np.allclose(x_projection, x_reference)
+        assert np.allclose(y_projection, y_reference)
+
+
+def test_projection_profiles_clipped(page):
+    # rectangle past the right and bottom page edges is clipped like array slicing
+    bins = 20
+    (x_projection,), (y_projection,) = projection_profiles(integral_image(page), [(536, 824, 400, 500)], bins=bins)
+    x_reference, y_reference = resize_profiles(page[824:824 + 500, 536:536 + 400], bins)
+    assert np.allclose(x_projection, x_reference)
+    assert np.allclose(y_projection, y_reference)
@@ -0,0 +1,66 @@
+import cv2
+import numpy as np
+import torch
+from skimage import measure
+
+from unet.projections import extract_masks_rects, process_patches
+
+
+def extract_masks_rects_per_class(mask):
+    # implementation before the single labelling pass
+    rectangles = []
+    masks = []
+    classes = []
+    for class_id in np.unique(mask):
+        if class_id == 0:
+            continue
+        labeled_mask = measure.label(mask == class_id, background=0)
+        for i in np.unique(labeled_mask):
+            if i == 0:
+                continue
+            classes.append(class_id)
+
+            i_mask = labeled_mask == i
+            contours, _ = cv2.findContours(i_mask.astype(np.uint8), 1, 2)
+            biggest_cntr = max(contours, key=cv2.contourArea)
+            rect = cv2.boundingRect(biggest_cntr)
+            rectangles.append(rect)
+
+            x, y, w, h = rect
+            i_mask = np.zeros_like(i_mask)
+            i_mask[y:y + h, x:x + w] = True
+            masks.append(i_mask)
+    return masks, rectangles, classes
+
+
+def test_extract_masks_rects_parity():
+    random = np.random.RandomState(0)
+    label_mask = np.zeros((256, 256), dtype=np.int64)
+    for _ in range(60):
+        x, y = random.randint(0, 240), random.randint(0, 240)
+        label_mask[y:y + random.randint(1, 30), x:x + random.randint(1, 120)] = random.randint(1, 6)
+    for mask in (label_mask, label_mask > 0):
+        masks, rectangles, classes = extract_masks_rects(mask)
+        expected_masks, expected_rectangles, expected_classes = extract_masks_rects_per_class(mask)
+        assert rectangles == expected_rectangles and classes == expected_classes
+        assert all((m == e).all() for m, e in zip(masks, expected_masks))
+
+
+def inner_samples(length, output):
+    # output pixels whose sampling point lies inside the crop, where cv2.resize does not repeat the edge
+    points = (np.arange(output) + 0.5) * length / output - 0.5
+    return (points >= 0) & (points <= length - 1)
+
+
+def test_process_patches_resize_parity():
+    random = np.random.RandomState(0)
+    batch_img = random.rand(2, 1, 120, 240).astype(np.float32)
+    rectangles = [(20, 10, 150, 40), (5, 30, 37, 80), (100, 60, 128, 32), (60, 5, 11, 7)]
+    indices = [0, 1, 1, 0]
+    patches = process_patches(torch.from_numpy(batch_img), torch.tensor(rectangles), indices).numpy()
+    assert patches.shape == (len(rectangles), 1, 32, 128)
+    for patch, (x, y, w, h), index in zip(patches, rectangles, indices):
+        # implementation before RoIAlign
+        expected = cv2.resize(batch_img[index, 0, y:y + h, x:x + w], (128, 32))
+        inner = np.ix_(inner_samples(h, 32), inner_samples(w, 128))
+        assert np.allclose(patch[0][inner], expected[inner], atol=1e-4)
@@ -0,0 +1,27 @@
+import json
+import os
+
+import numpy as np
+
+from unet.datasets import collate_pages
+from unet.shards import IMAGES_FILE, INDEX_FILE, MASKS_FILE, ShardDataset
+
+
+def test_shard_dataset_returns_boxes(tmp_path):
+    width, height = 64, 48
+    images = np.full((2, height, width), 255, dtype=np.uint8)
+    masks = np.zeros((2, height, width), dtype=np.uint8)
+    masks[:, 5:20, 10:30] = 1
+    masks[1, 30:40, 5:60] = 3
+    np.save(str(tmp_path / IMAGES_FILE), images)
+    np.save(str(tmp_path / MASKS_FILE), masks)
+    with open(str(tmp_path / INDEX_FILE), "w") as f:
+        json.dump({"files": ["a.json", "b.json"], "categories": ["text"], "size": [width, height]}, f)
+
+    dataset = ShardDataset(str(tmp_path), return_boxes=True, crops_per_page=2)
+    batch = collate_pages([dataset[0], dataset[1]])
+    grey, mask, mask_with_class, boxes, box_classes, box_counts = batch
+    assert grey.shape == (4, 1, height, width)
+    assert box_counts.tolist() == [1, 1, 2, 2]
+    assert boxes[0, 0].tolist() == [10, 5, 20, 15]
+    assert sorted(box_classes[2].tolist()) == [1, 3]
@@ -0,0 +1,89 @@
+import os
+
+import pytest
+
+import utils.tfrecords
+from utils.tfrecords import (TFRecordWriter, bytes_feature, bytes_list_feature, crc32c, example, float_list_feature,
+                             int64_feature, int64_list_feature, parse_example, read_records)
+
+
+@pytest.fixture
+def features():
+    return {
+        "image/height": int64_feature(1024),
+        "image/filename": bytes_feature(b"page.jpg"),
+        "image/encoded": bytes_feature(os.urandom(3000)),
+        "image/object/bbox/xmin": float_list_feature([0.1, 0.25, 0.5]),
+        "image/object/bbox/xmax": float_list_feature([]),
+        "image/object/class/text": bytes_list_feature([b"text", b"maths"]),
+        "image/object/class/label": int64_list_feature([1, 2, -1]),
+        "image/object/difficult": int64_list_feature([]),
+        "image/object/class/other": bytes_list_feature([]),
+    }
+
+
+@pytest.mark.parametrize("package", [True, False])
+def test_crc32c(monkeypatch, package):
+    # check values of RFC 3720, with and without the `crc32c` package
+    if not package:
+        monkeypatch.setattr(utils.tfrecords, "_crc32c", None)
+    assert crc32c(b"123456789") == 0xE3069283
+    assert crc32c(bytes(32)) == 0x8A9136AA
+    assert crc32c(b"\xff" * 32) == 0x62A8AB43
+
+
+def test_crc32c_lanes(monkeypatch):
+    # NumPy lanes of the fallback against the byte loop
+    monkeypatch.setattr(utils.tfrecords, "_crc32c", None)
+    for length in (1024, 1025, 4096, 300001):
+        data = os.urandom(length)
+        assert crc32c(data) == utils.tfrecords._crc32c_update(0xFFFFFFFF, data) ^ 0xFFFFFFFF
+
+
+def test_parse_example(features):
+    record = example(features)
+    parsed = parse_example(record)
+    assert parsed.keys() == features.keys()
+    assert parsed["image/height"] == [1024]
+    assert parsed["image/filename"] == [b"page.jpg"]
+    assert len(parsed["image/encoded"][0]) == 3000
+    assert parsed["image/object/bbox/xmin"] == pytest.approx([0.1, 0.25, 0.5])
+    assert parsed["image/object/bbox/xmax"] == []
+    assert parsed["image/object/class/text"] == [b"text", b"maths"]
+    assert parsed["image/object/class/label"] == [1, 2, -1]
+    assert parsed["image/object/difficult"] == []
+    assert parsed["image/object/class/other"] == []
+
+
+def test_read_records(tmp_path, features):
+    records = [example(features), b"", example({"image/height": int64_feature(-2 ** 63)})]
+    path = str(tmp_path / "data.record")
+    with TFRecordWriter(path) as writer:
+        for record in records:
+            writer.write(record)
+    assert list(read_records(path, check_crc=True)) == records
+    assert parse_example(records[2])["image/height"] == [-2 ** 63]
+
+
+def test_read_records_corrupted(tmp_path, features):
+    path = tmp_path / "data.record"
+    with TFRecordWriter(str(path)) as writer:
+        writer.write(example(features))
+    data = bytearray(path.read_bytes())
+    data[20] ^= 0xFF
+    path.write_bytes(bytes(data))
+    with pytest.raises(IOError):
+        list(read_records(str(path), check_crc=True))
+
+
+def test_tensorflow_parity(tmp_path, features):
+    tf = pytest.importorskip("tensorflow")
+    record = example(features)
+    assert tf.train.Example.FromString(record).SerializeToString(deterministic=True) == record
+    path, reference = str(tmp_path / "data.record"), str(tmp_path / "reference.record")
+    with TFRecordWriter(path) as writer:
+        writer.write(record)
+    with tf.io.TFRecordWriter(reference) as writer:
+        writer.write(record)
+    with open(path, "rb") as f, open(reference, "rb") as f_reference:
+        assert f.read() == f_reference.read()
@@ -0,0 +1,71 @@
+import numpy as np
+import pytest
+
+from benchmarks.reference import random_boxes
+from unet.object_detection_metrics.BoundingBox import BoundingBox
+from unet.object_detection_metrics.BoundingBoxes import BoundingBoxes
+from unet.object_detection_metrics.Evaluator import Evaluator
+from unet.object_detection_metrics.utils import MethodAveragePrecision
+from unet.object_detection_metrics.voc import (COCO_THRESHOLDS, APAccumulator, coco_metrics, pascal_voc_metrics,
+                                               voc_metrics)
+
+
+def same(a, b):
+    assert len(a) == len(b)
+    for ra, rb in zip(a, b):
+        assert ra.keys() == rb.keys()
+        for key in ra:
+            assert np.array_equal(np.asarray(ra[key]), np.asarray(rb[key]), equal_nan=True), key
+
+
+@pytest.mark.filterwarnings("ignore::RuntimeWarning")
+def test_pascal_voc_metrics_parity():
+    random = np.random.RandomState(0)
+    for _ in range(20):
+        boxes = random_boxes(random, images=random.randint(1, 40), gts=random.randint(0, 300),
+                             dets=random.randint(0, 600))
+        for threshold in (0.3, 0.5, 0.75):
+            for method in MethodAveragePrecision:
+                same(Evaluator().GetPascalVOCMetrics(boxes, threshold, method),
+                     pascal_voc_metrics(boxes, threshold, method))
+
+
+@pytest.mark.filterwarnings("ignore::RuntimeWarning")
+def test_ap_accumulator_parity():
+    random = np.random.RandomState(1)
+    for _ in range(10):
+        batches = [random_boxes(random, images=random.randint(1, 10), gts=random.randint(0, 60),
+                                dets=random.randint(0, 120)) for _ in range(random.randint(1, 8))]
+        # two workers, partial readout in the middle
+        accumulator, other = APAccumulator(), APAccumulator()
+        for i, batch in enumerate(batches):
+            (accumulator if i % 2 == 0 else other).add(batch)
+            if i == len(batches) // 2:
+                accumulator.result()
+        accumulator.merge(other)
+        # all boxes in the merged order, image names made unique across batches
+        order = list(range(0, len(batches), 2)) + list(range(1, len(batches), 2))
+        boxes = BoundingBoxes()
+        for i in order:
+            for bb in batches[i].getBoundingBoxes():
+                boxes.addBoundingBox(BoundingBox("{}/{}".format(i, bb.getImageName()), bb.getClassId(),
+                                                 *bb.getAbsoluteBoundingBox(), bbType=bb.getBBType(),
+                                                 classConfidence=bb.getConfidence()))
+        same(pascal_voc_metrics(boxes), accumulator.result())
+
+
+@pytest.mark.filterwarnings("ignore::RuntimeWarning")
+def test_coco_metrics_parity():
+    random = np.random.RandomState(2)
+    for _ in range(10):
+        boxes = random_boxes(random, images=random.randint(1, 40), gts=random.randint(0, 300),
+                             dets=random.randint(0, 600))
+        columns = boxes.arrays()
+        results = coco_metrics(*columns, area_ranges={"all": (0, np.inf), "any": (1, 10 ** 6)})
+        for i, iou_threshold in enumerate(COCO_THRESHOLDS):
+            voc = voc_metrics(*columns, iou_threshold=iou_threshold)
+            for area in ("all", "any"):
+                coco = [r for r in results if r['area'] == area]
+                assert [r['class'] for r in voc] == [r['class'] for r in coco]
+                assert [r['AP'] for r in voc] == [r['AP'][i] for r in coco]
+                assert [r['total TP'] for r in voc] == [r['total TP'][i] for r in coco]
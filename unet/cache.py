@@ -0,0 +1,92 @@
+import argparse
+import hashlib
+import os
+
+import numpy as np
+from tqdm import tqdm
+
+from utils.index import list_annotations, parse_sources, source_entry
+
+
+class PageCache(object):
+    """
+    On-disk cache of rendered pages (scaled grey image + class mask).
+    Entry is keyed by annotation path and render params (category set,
+    target size, decode mode), and is invalidated when annotation mtime changes.
+    """
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+
+    def entry_path(self, file, params):
+        key = repr((os.path.abspath(file), params))
+        return os.path.join(self.path, hashlib.sha1(key.encode("utf8")).hexdigest() + ".npz")
+
+    def load(self, file, params):
+        path = self.entry_path(file, params)
+        if not os.path.exists(path):
+            return None
+        try:
+            with np.load(path) as entry:
+                if entry["mtime"] != os.path.getmtime(file):
+                    return None
+                return entry["grey"], entry["mask"].astype(np.int32)
+        except (IOError, ValueError, KeyError):
+            # broken entry, e.g. interrupted write
+            return None
+
+    def save(self, file, params, grey, mask):
+        path = self.entry_path(file, params)
+        tmp_path = "{}.{}.tmp".format(path, os.getpid())
+        with open(tmp_path, "wb") as f:
+            np.savez(f, grey=grey, mask=mask.astype(np.uint8),
+                     mtime=os.path.getmtime(file))
+        os.replace(tmp_path, path)
+
+    def get(self, file, params, render):
+        """
+        Get page from cache or render and store it.
+        :param file: path to annotation file
+        :param params: tuple of render params, e.g. (categories, size)
+        :param render: function file -> (grey, mask)
+        :return: grey - np.uint8(H, W), mask - np.int32(H, W)
+        """
+        entry = self.load(file, params)
+        if entry is not None:
+            return entry
+        grey, mask = render(file)
+        self.save(file, params, grey, mask)
+        return grey, mask
+
+
+def build(cache_path, in_paths, categories=("text", "maths", "separator"), size=(736, 1024),
+          reduced_decode=False):
+    """
+    Render all pages of the sources into the cache.
+    :param in_paths: entries of YAML `data.list`, see `utils.index.parse_sources`
+    """
+    from .datasets import MaskDataset
+
+    files, sources = [], []
+    for source, in_path in parse_sources(in_paths):
+        source_files = list_annotations(source, in_path)
+        files += source_files
+        sources += [source] * len(source_files)
+    dataset = MaskDataset(files, categories=categories, size=size, cache=PageCache(cache_path),
+                          reduced_decode=reduced_decode, sources=sources)
+    for index in tqdm(range(len(dataset)), desc="cache"):
+        dataset.load_page(index)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Render annotated folders into page cache")
+    parser.add_argument("cache", help="cache directory")
+    parser.add_argument("paths", nargs="+", type=source_entry,
+                        help="supervisely folders or SOURCE:PATH, e.g. impact:_data/impact")
+    parser.add_argument("--categories", nargs="+", default=["text", "maths", "separator"])
+    parser.add_argument("--size", nargs=2, type=int, default=[736, 1024], metavar=("WIDTH", "HEIGHT"))
+    parser.add_argument("--reduced-decode", action="store_true",
+                        help="decode grayscale at reduced scale, same as data.reduced_decode")
+    args = parser.parse_args()
+    build(args.cache, args.paths, categories=args.categories, size=args.size,
+          reduced_decode=args.reduced_decode)
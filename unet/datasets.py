@@ -1,63 +1,108 @@
 import os
+import random
 
 import cv2
 import numpy as np
-from torch.utils.data import Dataset
+from torch.nn.utils.rnn import pad_sequence
+from torch.utils.data import Dataset, IterableDataset, get_worker_info
+from torch.utils.data.dataloader import default_collate
 import torch
 
 from utils import supervisely
+from utils.image import REDUCED_READ_FLAGS, find_reduction
+from utils.index import SUPERVISELY, parse_annotation
+from utils.tfrecords import read_records, parse_example
+from .projections import extract_masks_rects
 
 
-def semisuper_contour_gt(img):
-    mask = img != 255
-    coords = np.argwhere(mask)
-    # indices in unique/sorted by first coord
-    indeces = np.unique(coords[:,0], return_index=True)[1]
-    # for each Y first in line, by X
-    bounds1 = coords[indeces]
-    # last of current line
-    # then reverse so we can create a controur
+def _ink_row_bounds(ink):
+    # rows with ink and first / last ink column in each of them, all empty for blank or empty patch
+    rows = np.flatnonzero(ink.any(axis=1))
+    if len(rows) == 0:
+        return rows, rows, rows
+    ink = ink[rows]
+    first = ink.argmax(axis=1)
+    last = ink.shape[1] - 1 - ink[:, ::-1].argmax(axis=1)
+    return rows, first, last
+
+
+def _row_bounds_hull(rows, first, last):
     # going from left top to left bottom
-    # then from right bottom to right top !!!
-    bounds2 = coords[np.roll(indeces - 1, -1)][::-1]
+    # then from right bottom to right top
+    left = np.stack((first, rows), axis=1)
+    right = np.stack((last, rows), axis=1)[::-1]
+    return cv2.convexHull(np.concatenate((left, right)).astype(np.int32))
 
-    bounds1[:,[1,0]] = bounds1[:,[0,1]]
-    bounds2[:,[1,0]] = bounds2[:,[0,1]]
-    hull = cv2.convexHull(np.concatenate((bounds1, bounds2)))
-    mask = np.zeros_like(mask, dtype=np.uint8)
-    cv2.drawContours(mask, [hull], -1, (1), -1)
-    return mask
 
+def semisuper_contour_gt(img):
+    """
+    Fill convex hull of first and last ink pixels of each row of the patch.
+    :param img: np.uint8(H, W) - grey patch, 255 is background
+    :return: np.uint8(H, W) - 1 inside the hull, all zeros for blank or empty patch
+    """
+    result = np.zeros(img.shape, dtype=np.uint8)
+    rows, first, last = _ink_row_bounds(img != 255)
+    if len(rows):
+        cv2.drawContours(result, [_row_bounds_hull(rows, first, last)], -1, (1), -1)
+    return result
 
-class MaskDataset(Dataset):
-    ANNOTATION_FOLDER = supervisely.ANNOTATION_FOLDER
-    def __init__(self, files, categories=("text", "maths", "separator"),
-                 transform_img=None, transform_mask=None, augmentations=None):
-        super().__init__()
-        self.files = files
-        self.categories = set(categories)
-        self.transform_img = transform_img
-        self.transform_mask = transform_mask
-        self.augmentations = augmentations
 
-    def __len__(self):
-        return len(self.files)
+def semisuper_page_mask(grey, boxes, class_ids):
+    """
+    Rasterise semi-supervised masks of all regions of the page in one call.
+    Same as writing `semisuper_contour_gt` of each region patch into the mask in order.
+    :param grey: np.uint8(H, W) - page, 255 is background
+    :param boxes: np.array(N, 4) - (x0, y0, x1, y1) of regions, x1 and y1 exclusive
+    :param class_ids: list(N) - mask value of each region
+    :return: np.int32(H, W) - class mask
+    """
+    height, width = grey.shape
+    mask = np.zeros((height, width), dtype=np.uint8)
+    boxes = np.asarray(boxes, dtype=np.int64).reshape(-1, 4)
+    boxes[:, [0, 2]] = np.clip(boxes[:, [0, 2]], 0, width)
+    boxes[:, [1, 3]] = np.clip(boxes[:, [1, 3]], 0, height)
+    ink = grey != 255
 
-    def __getitem__(self, index):
-        file = self.files[index]
-        image_object = supervisely.parse_json(file)
-        image_object = image_object.scale((736, 1024))
-        grey = cv2.cvtColor(image_object.image, cv2.COLOR_BGR2GRAY)
-        mask = np.zeros_like(grey, dtype=np.int32)
-
-        for region in image_object.regions:
-            if region.category in self.categories:
-                mn = np.min(region.contour, axis=0)
-                mx = np.max(region.contour, axis=0)
-                img_patch = grey[mn[1]:mx[1], mn[0]:mx[0]]
-                semi_mask = semisuper_contour_gt(img_patch).astype(np.int32)
-                semi_mask[semi_mask > 0.5] = region.category_id
-                mask[mn[1]:mx[1], mn[0]:mx[0]] = semi_mask
+    for (x0, y0, x1, y1), class_id in zip(boxes, class_ids):
+        if x1 <= x0 or y1 <= y0:
+            # thin regions are truncated to zero width or height at small page sizes
+            continue
+        # patch overwrites everything under previous regions, as in per-patch version
+        mask[y0:y1, x0:x1] = 0
+        rows, first, last = _ink_row_bounds(ink[y0:y1, x0:x1])
+        if len(rows):
+            hull = _row_bounds_hull(rows + y0, first + x0, last + x0)
+            cv2.drawContours(mask, [hull], -1, int(class_id), -1)
+    return mask.astype(np.int32)
+
+
+def collate_pages(batch):
+    """
+    DataLoader collate_fn, pages with several crops are flattened into the batch.
+    Ground-truth boxes of `MaskDataset(return_boxes=True)` are padded with zeros:
+    boxes - (B, M, 4), box classes - (B, M), box counts - (B,).
+    """
+    samples = []
+    for item in batch:
+        if isinstance(item, list):
+            samples += item
+        else:
+            samples.append(item)
+    if len(samples[0]) == 3:
+        return default_collate(samples)
+    grey, mask, mask_with_class = default_collate([sample[:3] for sample in samples])
+    boxes = pad_sequence([sample[3] for sample in samples], batch_first=True)
+    box_classes = pad_sequence([sample[4] for sample in samples], batch_first=True)
+    box_counts = torch.tensor([len(sample[3]) for sample in samples], dtype=torch.long)
+    return grey, mask, mask_with_class, boxes, box_classes, box_counts
+
+
+class PageSamples(object):
+    """
+    Augmentation and conversion of rendered pages to samples, shared by page datasets.
+    Subclasses set `augmentations`, `transform_img`, `transform_mask` and `return_boxes`.
+    """
+    def make_sample(self, grey, mask):
         # mask = (mask > 0).astype(np.uint)
 
         if self.augmentations:
@@ -68,6 +113,11 @@ class MaskDataset(Dataset):
             # grey = cv2.resize(grey, (736, 1024))
             # mask = cv2.resize(mask.astype(np.float), (736, 1024))
 
+        if self.return_boxes:
+            _, rectangles, classes = extract_masks_rects(mask, return_masks=False)
+            boxes = torch.tensor(rectangles, dtype=torch.long).reshape(-1, 4)
+            box_classes = torch.from_numpy(np.array(classes, dtype=np.int64))
+
         # mask.dtype has been bool.
         mask_with_class = mask.astype(np.int32).copy()
         mask_with_class = torch.from_numpy(mask_with_class).long()
@@ -83,4 +133,165 @@ class MaskDataset(Dataset):
         else:
             mask = torch.from_numpy(mask).float().unsqueeze(0)
 
+        if self.return_boxes:
+            return grey, mask, mask_with_class, boxes, box_classes
         return grey, mask, mask_with_class
+
+
+class MaskDataset(PageSamples, Dataset):
+    ANNOTATION_FOLDER = supervisely.ANNOTATION_FOLDER
+    def __init__(self, files, categories=("text", "maths", "separator"),
+                 transform_img=None, transform_mask=None, augmentations=None,
+                 size=(736, 1024), cache=None, reduced_decode=False, index=None, crops_per_page=1,
+                 return_boxes=False, sources=None):
+        super().__init__()
+        self.files = files
+        # annotation source of every file, see `utils.index.READERS`, Supervisely by default
+        self.sources = dict(zip(files, sources)) if sources is not None else {}
+        self.categories = set(categories)
+        self.transform_img = transform_img
+        self.transform_mask = transform_mask
+        self.augmentations = augmentations
+        self.size = tuple(size)
+        self.cache = cache
+        self.reduced_decode = reduced_decode
+        self.index = index
+        # each page gives this many independently augmented samples, see `collate_pages`
+        self.crops_per_page = crops_per_page
+        # emit boxes (x, y, w, h) and classes of the augmented mask, see `collate_pages`
+        self.return_boxes = return_boxes
+
+    def __len__(self):
+        return len(self.files)
+
+    def parse_page(self, file):
+        min_size = self.size if self.reduced_decode else None
+        if self.index is not None:
+            return self.index.parse(file, grayscale=self.reduced_decode, min_size=min_size)
+        return parse_annotation(self.sources.get(file, SUPERVISELY), file, grayscale=self.reduced_decode,
+                                min_size=min_size)
+
+    def render_page(self, file):
+        """
+        Decode annotation file into scaled grey image and class mask.
+        :param file: path to annotation
+        :return: grey - np.uint8(H, W), mask - np.int32(H, W)
+        """
+        image_object = self.parse_page(file).scale(self.size)
+        if self.reduced_decode:
+            grey = image_object.image
+        else:
+            grey = cv2.cvtColor(image_object.image, cv2.COLOR_BGR2GRAY)
+
+        regions = [region for region in image_object.regions if region.category in self.categories]
+        boxes = [np.concatenate((np.min(region.contour, axis=0), np.max(region.contour, axis=0)))
+                 for region in regions]
+        mask = semisuper_page_mask(grey, boxes, [region.category_id for region in regions])
+        return grey, mask
+
+    def load_page(self, index):
+        file = self.files[index]
+        if self.cache is None:
+            return self.render_page(file)
+        params = (sorted(self.categories), self.size, self.reduced_decode)
+        return self.cache.get(file, params, self.render_page)
+
+    def __getitem__(self, index):
+        grey, mask = self.load_page(index)
+        if self.crops_per_page > 1:
+            return [self.make_sample(grey, mask) for _ in range(self.crops_per_page)]
+        return self.make_sample(grey, mask)
+
+
+def shuffled(items, buffer_size, rng):
+    """
+    Approximate shuffle of a stream: each item is swapped with a random one of `buffer_size` buffered items.
+    :param items: iterable
+    :param buffer_size: number of buffered items, 1 keeps order
+    :param rng: random.Random
+    :return: generator
+    """
+    buffer = []
+    for item in items:
+        if len(buffer) < buffer_size:
+            buffer.append(item)
+            continue
+        i = rng.randrange(buffer_size)
+        yield buffer[i]
+        buffer[i] = item
+    rng.shuffle(buffer)
+    yield from buffer
+
+
+class RecordDataset(PageSamples, IterableDataset):
+    """
+    Streams pages from TFRecord shards written by `Image.to_tfrecord` at `Region.LEVEL_CATEGORY`
+    and yields the same samples as `MaskDataset`.
+    With DataLoader workers each worker reads its own shards, so there should be at least as many shards as workers.
+    """
+    def __init__(self, paths, categories=("text", "maths", "separator"),
+                 transform_img=None, transform_mask=None, augmentations=None,
+                 size=(736, 1024), reduced_decode=False, crops_per_page=1, return_boxes=False,
+                 shuffle_buffer=1, check_crc=False):
+        super().__init__()
+        self.paths = list(paths)
+        self.categories = set(categories)
+        self.transform_img = transform_img
+        self.transform_mask = transform_mask
+        self.augmentations = augmentations
+        self.size = tuple(size)
+        self.reduced_decode = reduced_decode
+        self.crops_per_page = crops_per_page
+        self.return_boxes = return_boxes
+        # pages buffered for shuffling, 1 keeps order of records
+        self.shuffle_buffer = shuffle_buffer
+        self.check_crc = check_crc
+
+    def render_record(self, record):
+        """
+        Decode serialized example into scaled grey image and class mask.
+        :param record: serialized `tf.train.Example`
+        :return: grey - np.uint8(H, W), mask - np.int32(H, W)
+        """
+        features = parse_example(record)
+        reduction = 1
+        if self.reduced_decode:
+            reduction = find_reduction((features["image/width"][0], features["image/height"][0]), self.size)
+        encoded = np.frombuffer(features["image/encoded"][0], dtype=np.uint8)
+        grey = cv2.resize(cv2.imdecode(encoded, REDUCED_READ_FLAGS[True, reduction]), self.size)
+
+        selected = [i for i, name in enumerate(features["image/object/class/text"])
+                    if name.decode("utf8") in self.categories]
+        boxes = np.stack([features["image/object/bbox/" + key] for key in ("xmin", "ymin", "xmax", "ymax")], axis=1)
+        boxes = boxes.reshape(-1, 4)[selected].astype(np.float64) * (self.size * 2)
+        # coordinates are float32 in records, offset undoes rounding below integers before truncation
+        boxes = (boxes + 1e-4).astype(np.int64)
+        class_ids = [features["image/object/class/label"][i] for i in selected]
+        mask = semisuper_page_mask(grey, boxes, class_ids)
+        return grey, mask
+
+    def records(self):
+        """
+        Records of shards of the current worker, shuffled when `shuffle_buffer` > 1.
+        """
+        # torch generator is seeded per worker and per epoch by DataLoader
+        rng = random.Random(torch.empty((), dtype=torch.int64).random_().item())
+        paths = self.paths
+        worker = get_worker_info()
+        if worker is not None:
+            paths = paths[worker.id::worker.num_workers]
+        if self.shuffle_buffer > 1:
+            paths = rng.sample(paths, len(paths))
+        records = (record for path in paths for record in read_records(path, check_crc=self.check_crc))
+        if self.shuffle_buffer > 1:
+            records = shuffled(records, self.shuffle_buffer, rng)
+        return records
+
+    def __iter__(self):
+        for record in self.records():
+            grey, mask = self.render_record(record)
+            if self.crops_per_page > 1:
+                yield [self.make_sample(grey, mask) for _ in range(self.crops_per_page)]
+            else:
+                yield self.make_sample(grey, mask)
+
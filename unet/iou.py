@@ -34,4 +34,79 @@ def bb_intersection_over_union_numpy(boxA, boxB):
     iou = interArea / float(boxAArea + boxBArea - interArea)
 
     # return the intersection over union value
-    return iou
\ No newline at end of file
+    return iou
+
+
+def xywh_to_xyx2y2(boxes):
+    """
+    :param boxes: np.array(N, 4) - (x, y, w, h)
+    :return: np.array(N, 4) - (x, y, x + w, y + h)
+    """
+    boxes = np.array(boxes, dtype=np.float64).reshape(-1, 4)
+    boxes[:, 2:] += boxes[:, :2]
+    return boxes
+
+
+def iou_xyx2y2(boxesA, boxesB):
+    """
+    Iou of rectangles given by corners, borders are inclusive
+    as in `bb_intersection_over_union_numpy`. Arrays are broadcast against each other.
+    :param boxesA: np.array(..., 4) - (x1, y1, x2, y2)
+    :param boxesB: np.array(..., 4) - (x1, y1, x2, y2)
+    :return: np.array(...) of iou
+    """
+    boxesA = np.asarray(boxesA, dtype=np.float64)
+    boxesB = np.asarray(boxesB, dtype=np.float64)
+
+    # intersection rectangle of every pair
+    xA = np.maximum(boxesA[..., 0], boxesB[..., 0])
+    yA = np.maximum(boxesA[..., 1], boxesB[..., 1])
+    xB = np.minimum(boxesA[..., 2], boxesB[..., 2])
+    yB = np.minimum(boxesA[..., 3], boxesB[..., 3])
+    interArea = np.where((xB >= xA) & (yB >= yA), (xB - xA + 1) * (yB - yA + 1), 0)
+
+    boxAArea = (boxesA[..., 2] - boxesA[..., 0] + 1) * (boxesA[..., 3] - boxesA[..., 1] + 1)
+    boxBArea = (boxesB[..., 2] - boxesB[..., 0] + 1) * (boxesB[..., 3] - boxesB[..., 1] + 1)
+    return interArea / (boxAArea + boxBArea - interArea)
+
+
+def iou_matrix_xyx2y2(boxesA, boxesB):
+    """
+    Pairwise iou of rectangles given by corners, see `iou_xyx2y2`.
+    :param boxesA: np.array(N, 4) - (x1, y1, x2, y2)
+    :param boxesB: np.array(M, 4) - (x1, y1, x2, y2)
+    :return: np.array(N, M) of iou
+    """
+    boxesA = np.asarray(boxesA, dtype=np.float64).reshape(-1, 1, 4)
+    boxesB = np.asarray(boxesB, dtype=np.float64).reshape(1, -1, 4)
+    return iou_xyx2y2(boxesA, boxesB)
+
+
+def iou_matrix(boxesA, boxesB):
+    """
+    Pairwise iou of rectangles, same as `bb_intersection_over_union_numpy` for every pair.
+    :param boxesA: np.array(N, 4) - (x, y, w, h)
+    :param boxesB: np.array(M, 4) - (x, y, w, h)
+    :return: np.array(N, M) of iou
+    """
+    return iou_matrix_xyx2y2(xywh_to_xyx2y2(boxesA), xywh_to_xyx2y2(boxesB))
+
+
+def match_rectangles(pred_rectangles, true_rectangles, threshold=0.5):
+    """
+    For every predicted rectangle find true rectangle with the highest iou
+    not lower than `threshold`, the last one of equal candidates wins.
+    :param pred_rectangles: np.array(N, 4) - (x, y, w, h)
+    :param true_rectangles: np.array(M, 4) - (x, y, w, h)
+    :param threshold: minimal iou of matched pair
+    :return: true_indices - np.array(N), -1 when not matched,
+             ious - np.array(N), `threshold` when not matched
+    """
+    iou = iou_matrix(pred_rectangles, true_rectangles)
+    N, M = iou.shape
+    if M == 0:
+        return np.full(N, -1, dtype=np.int64), np.full(N, threshold, dtype=np.float64)
+    best = M - 1 - iou[:, ::-1].argmax(axis=1)
+    best_iou = iou[np.arange(N), best]
+    matched = best_iou >= threshold
+    return np.where(matched, best, -1), np.where(matched, best_iou, threshold)
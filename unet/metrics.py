@@ -1,11 +1,10 @@
 import torch
 import numpy as np
 
-from .projections import extract_masks_rects
-from .object_detection_metrics.BoundingBox import BoundingBox
+from .projections import extract_masks_rects, split_true_boxes
 from .object_detection_metrics.BoundingBoxes import BoundingBoxes
 from .object_detection_metrics.utils import BBFormat, BBType
-from .object_detection_metrics.Evaluator import Evaluator
+from .object_detection_metrics.voc import pascal_voc_metrics, APAccumulator, coco_metrics, coco_summary
 from .iou import bb_intersection_over_union_numpy
 
 SMOOTH = 1e-6
@@ -56,68 +55,78 @@ def special_accuracy(pred, true, true_pred_map):
     return intersection.float().mean()
 
 
-def maP_create_boxes(pred_rectangles, pred_classes, image_indeces, label_mask, relative_index=0):
+def maP_create_boxes(pred_rectangles, pred_classes, image_indeces, label_mask, relative_index=0, true_boxes=None,
+                     boxes=None):
     """
 
     :param pred_rectangles:
     :param pred_classes: torch.Tensor(N, C) logits
     :param image_indeces:
     :param label_mask:
-    :return:
+    :param true_boxes: (boxes, box classes, box counts) collated by `datasets.collate_pages`,
+    ground truth is extracted from `label_mask` if not given
+    :param boxes: BoundingBoxes to append to, new one by default
+    :return: BoundingBoxes
     """
     label_mask = label_mask.detach().cpu().numpy()
     pred_rectangles = pred_rectangles.detach().cpu().numpy()
     pred_classes = pred_classes.softmax(1).detach().cpu().numpy()
+    if true_boxes is not None:
+        true_boxes = split_true_boxes(*(tensor.detach().cpu().numpy() for tensor in true_boxes))
+    if boxes is None:
+        boxes = BoundingBoxes()
 
-    boxes = []
     N = label_mask.shape[0]
+    image_names = np.array([str(relative_index + image_index) for image_index in range(N)])
     for image_index in range(N):
-        _, label_rectangles, label_classes = extract_masks_rects(label_mask[image_index])
-        for rect, class_id in zip(label_rectangles, label_classes):
-            x, y, w, h = rect
-            box = BoundingBox(
-                imageName=str(relative_index + image_index),
-                classId=class_id - 1,
-                x=x,y=y,w=w,h=h,
-                bbType=BBType.GroundTruth,
-                classConfidence=1,
-            )
-            boxes.append(box)
-
-    for image_index, rect, class_distribution in zip(image_indeces, pred_rectangles, pred_classes):
-        pred_class = np.argmax(class_distribution)
-        confidence = class_distribution[pred_class]
-        x, y, w, h = rect
-        box = BoundingBox(
-            imageName=str(relative_index + image_index),
-            classId=pred_class,
-            x=x,y=y,w=w,h=h,
-            bbType=BBType.Detected,
-            classConfidence=confidence,
-        )
-        boxes.append(box)
+        if true_boxes is None:
+            _, label_rectangles, label_classes = extract_masks_rects(label_mask[image_index], return_masks=False)
+        else:
+            label_rectangles, label_classes = true_boxes[image_index]
+        boxes.extend(image_names[[image_index] * len(label_rectangles)],
+                     np.array(label_classes) - 1,
+                     label_rectangles,
+                     BBType.GroundTruth,
+                     confidences=np.ones(len(label_rectangles)))
+
+    pred_class = pred_classes.argmax(1)
+    boxes.extend(image_names[np.asarray(image_indeces, dtype=np.int64)],
+                 pred_class,
+                 pred_rectangles,
+                 BBType.Detected,
+                 confidences=pred_classes[np.arange(len(pred_class)), pred_class])
     return boxes
 
 
-def mAP_wrapper(pred_rectangles, pred_classes, image_indeces, label_mask, relative_index=0):
+def mAP_wrapper(pred_rectangles, pred_classes, image_indeces, label_mask, relative_index=0, true_boxes=None):
     """
 
     :param pred_rectangles:
     :param pred_classes: torch.Tensor(N, C) logits
     :param image_indeces:
     :param label_mask:
+    :param true_boxes: see `maP_create_boxes`
     :return:
     """
-    boxes_ = maP_create_boxes(pred_rectangles, pred_classes, image_indeces, label_mask, relative_index)
-    boxes = BoundingBoxes()
-    for box in boxes_:
-        boxes.addBoundingBox(box)
-    res = Evaluator().GetPascalVOCMetrics(boxes, IOUThreshold=0.5)
+    boxes = maP_create_boxes(pred_rectangles, pred_classes, image_indeces, label_mask, relative_index, true_boxes)
+    res = pascal_voc_metrics(boxes, iou_threshold=0.5)
     # print(len(res))
     return res
 
 
 def mAP_wrapper_from_boxes(boxes):
-    res = Evaluator().GetPascalVOCMetrics(boxes, IOUThreshold=0.5)
+    res = pascal_voc_metrics(boxes, iou_threshold=0.5)
     # print(len(res))
     return res
+
+
+def coco_mAP_wrapper_from_boxes(boxes, area_ranges=None):
+    """
+    mAP over IoU thresholds .5:.95 computed in one pass, see `coco_metrics`.
+    :param boxes: BoundingBoxes
+    :param area_ranges: dict name -> (min area, max area) in pixels, e.g. to separate
+    thin separators from paragraphs, all boxes by default
+    :return: dict area range -> {"mAP", "AP50", "AP75"}
+    """
+    res = coco_metrics(*boxes.arrays(), area_ranges=area_ranges)
+    return coco_summary(res)
@@ -1,66 +1,199 @@
+import numpy as np
+
 from .BoundingBox import *
 from .utils import *
 
 
 class BoundingBoxes:
+    """
+    Columnar container of bounding boxes: image names and classes are interned,
+    confidences, types and absolute XYX2Y2 coordinates are kept in numpy arrays
+    grown by doubling. BoundingBox objects are built on demand as views of rows.
+    """
+    _COLUMNS = ("_imageIds", "_classIds", "_confidences", "_bbTypes", "_boxes", "_imgSizes")
+
     def __init__(self):
-        self._boundingBoxes = []
+        self.removeAllBoundingBoxes()
+
+    def removeAllBoundingBoxes(self):
+        self._size = 0
+        self._imageNames, self._imageIndex = [], {}
+        self._classes, self._classIndex = [], {}
+        self._imageIds = np.zeros(0, dtype=np.int64)
+        self._classIds = np.zeros(0, dtype=np.int64)
+        # nan when not informed
+        self._confidences = np.zeros(0, dtype=np.float64)
+        self._bbTypes = np.zeros(0, dtype=np.int8)
+        self._boxes = np.zeros((0, 4), dtype=np.float64)
+        # nan when not informed
+        self._imgSizes = np.zeros((0, 2), dtype=np.float64)
+
+    def _reserve(self, count):
+        capacity = len(self._imageIds)
+        if self._size + count <= capacity:
+            return
+        capacity = max(self._size + count, 2 * capacity, 16)
+        for name in self._COLUMNS:
+            column = getattr(self, name)
+            grown = np.empty((capacity,) + column.shape[1:], dtype=column.dtype)
+            grown[:self._size] = column[:self._size]
+            setattr(self, name, grown)
+
+    @staticmethod
+    def _intern(values, names, index):
+        unique, inverse = np.unique(np.asarray(values), return_inverse=True)
+        ids = [BoundingBoxes._internValue(value, names, index) for value in unique.tolist()]
+        return np.array(ids, dtype=np.int64)[inverse]
+
+    @staticmethod
+    def _internValue(value, names, index):
+        if value not in index:
+            index[value] = len(names)
+            names.append(value)
+        return index[value]
 
     def addBoundingBox(self, bb):
-        self._boundingBoxes.append(bb)
+        confidence = bb.getConfidence()
+        imgSize = bb.getImageSize()
+        self._reserve(1)
+        i = self._size
+        self._imageIds[i] = self._internValue(bb.getImageName(), self._imageNames, self._imageIndex)
+        self._classIds[i] = self._internValue(bb.getClassId(), self._classes, self._classIndex)
+        self._confidences[i] = np.nan if confidence is None else confidence
+        self._bbTypes[i] = bb.getBBType().value
+        self._boxes[i] = bb.getAbsoluteBoundingBox(BBFormat.XYX2Y2)
+        self._imgSizes[i] = np.nan if imgSize[0] is None else imgSize
+        self._size += 1
+
+    def extend(self, imageNames, classIds, boxes, bbType, confidences=None, format=BBFormat.XYWH,
+               imgSizes=None):
+        """Append boxes given as arrays.
+        Args:
+            imageNames: N image names;
+            classIds: N class ids;
+            boxes: array (N, 4) of absolute coordinates in `format`;
+            bbType: BBType of all boxes or array of N BBType;
+            confidences (optional): N confidences, nan when not informed;
+            format (optional): BBFormat.XYWH or BBFormat.XYX2Y2;
+            imgSizes (optional): array (N, 2) of (width, height).
+        """
+        boxes = np.array(boxes, dtype=np.float64).reshape(-1, 4)
+        count = len(boxes)
+        if count == 0:
+            return
+        if format == BBFormat.XYWH:
+            boxes[:, 2:] += boxes[:, :2]
+        if isinstance(bbType, BBType):
+            bbTypes = bbType.value
+        else:
+            bbTypes = [t.value for t in bbType]
+        self._reserve(count)
+        rows = slice(self._size, self._size + count)
+        self._imageIds[rows] = self._intern(imageNames, self._imageNames, self._imageIndex)
+        self._classIds[rows] = self._intern(classIds, self._classes, self._classIndex)
+        self._confidences[rows] = np.nan if confidences is None else confidences
+        self._bbTypes[rows] = bbTypes
+        self._boxes[rows] = boxes
+        self._imgSizes[rows] = np.nan if imgSizes is None else imgSizes
+        self._size += count
+
+    def arrays(self):
+        """Columns consumed by the vectorized evaluator.
+        Returns:
+            image ids, classes, confidences (1 for ground truths), is ground truth - arrays (N),
+            boxes - array (N, 4) of absolute XYX2Y2 coordinates.
+        """
+        size = self._size
+        isGT = self._bbTypes[:size] == BBType.GroundTruth.value
+        confidences = np.where(isGT, 1, self._confidences[:size])
+        classes = np.array(self._classes)[self._classIds[:size]]
+        return self._imageIds[:size], classes, confidences, isGT, self._boxes[:size]
+
+    def _getBoundingBox(self, i):
+        confidence = self._confidences[i]
+        imgSize = self._imgSizes[i]
+        x, y, x2, y2 = self._boxes[i].tolist()
+        return BoundingBox(
+            self._imageNames[self._imageIds[i]],
+            self._classes[self._classIds[i]],
+            x, y, x2, y2,
+            imgSize=None if np.isnan(imgSize[0]) else tuple(imgSize.tolist()),
+            bbType=BBType(int(self._bbTypes[i])),
+            classConfidence=None if np.isnan(confidence) else confidence.item(),
+            format=BBFormat.XYX2Y2)
+
+    def _getBoundingBoxes(self, mask=None):
+        indices = range(self._size) if mask is None else np.flatnonzero(mask)
+        return [self._getBoundingBox(i) for i in indices]
 
     def removeBoundingBox(self, _boundingBox):
-        for d in self._boundingBoxes:
-            if BoundingBox.compare(d, _boundingBox):
-                del self._boundingBoxes[d]
-                return
+        imageId = self._imageIndex.get(_boundingBox.getImageName())
+        classId = self._classIndex.get(_boundingBox.getClassId())
+        if imageId is None or classId is None:
+            return
+        size = self._size
+        confidence = _boundingBox.getConfidence()
+        imgSize = _boundingBox.getImageSize()
+        matches = (self._imageIds[:size] == imageId) & (self._classIds[:size] == classId)
+        matches &= (self._boxes[:size] == _boundingBox.getAbsoluteBoundingBox(BBFormat.XYX2Y2)).all(1)
+        if confidence is None:
+            matches &= np.isnan(self._confidences[:size])
+        else:
+            matches &= self._confidences[:size] == confidence
+        if imgSize[0] is None:
+            matches &= np.isnan(self._imgSizes[:size, 0])
+        else:
+            matches &= (self._imgSizes[:size] == imgSize).all(1)
+        matches = np.flatnonzero(matches)
+        if len(matches) == 0:
+            return
+        i = matches[0]
+        for name in self._COLUMNS:
+            column = getattr(self, name)
+            column[i:size - 1] = column[i + 1:size]
+        self._size -= 1
 
     def __len__(self):
-        return len(self._boundingBoxes)
-
-    def removeAllBoundingBoxes(self):
-        self._boundingBoxes = []
+        return self._size
 
     def getBoundingBoxes(self):
-        return self._boundingBoxes
+        return self._getBoundingBoxes()
 
     def getBoundingBoxByClass(self, classId):
-        boundingBoxes = []
-        for d in self._boundingBoxes:
-            if d.getClassId() == classId:  # get only specified bounding box type
-                boundingBoxes.append(d)
-        return boundingBoxes
+        classId = self._classIndex.get(classId)
+        if classId is None:
+            return []
+        return self._getBoundingBoxes(self._classIds[:self._size] == classId)
 
     def getClasses(self):
-        classes = []
-        for d in self._boundingBoxes:
-            c = d.getClassId()
-            if c not in classes:
-                classes.append(c)
-        return classes
+        # in order of appearance
+        classIds, first = np.unique(self._classIds[:self._size], return_index=True)
+        return [self._classes[c] for c in classIds[np.argsort(first)]]
 
     def getBoundingBoxesByType(self, bbType):
         # get only specified bb type
-        return [d for d in self._boundingBoxes if d.getBBType() == bbType]
+        return self._getBoundingBoxes(self._bbTypes[:self._size] == bbType.value)
 
     def getBoundingBoxesByImageName(self, imageName):
-        # get only specified bb type
-        return [d for d in self._boundingBoxes if d.getImageName() == imageName]
+        imageId = self._imageIndex.get(imageName)
+        if imageId is None:
+            return []
+        return self._getBoundingBoxes(self._imageIds[:self._size] == imageId)
 
     def count(self, bbType=None):
         if bbType is None:  # Return all bounding boxes
-            return len(self._boundingBoxes)
-        count = 0
-        for d in self._boundingBoxes:
-            if d.getBBType() == bbType:  # get only specified bb type
-                count += 1
-        return count
+            return self._size
+        return int((self._bbTypes[:self._size] == bbType.value).sum())
 
     def clone(self):
         newBoundingBoxes = BoundingBoxes()
-        for d in self._boundingBoxes:
-            det = BoundingBox.clone(d)
-            newBoundingBoxes.addBoundingBox(det)
+        newBoundingBoxes._size = self._size
+        newBoundingBoxes._imageNames = list(self._imageNames)
+        newBoundingBoxes._imageIndex = dict(self._imageIndex)
+        newBoundingBoxes._classes = list(self._classes)
+        newBoundingBoxes._classIndex = dict(self._classIndex)
+        for name in self._COLUMNS:
+            setattr(newBoundingBoxes, name, getattr(self, name)[:self._size].copy())
         return newBoundingBoxes
 
     def drawAllBoundingBoxes(self, image, imageName):
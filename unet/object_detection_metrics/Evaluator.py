@@ -8,13 +8,13 @@
 #        Last modification: Oct 9th 2018                                                 #
 ###########################################################################################
 
-import os
 import sys
 from collections import Counter
 
-import matplotlib.pyplot as plt
 import numpy as np
 
+from ..iou import iou_matrix_xyx2y2
+from .average_precision import every_point_ap, eleven_point_ap
 from .BoundingBox import *
 from .BoundingBoxes import *
 from .utils import *
@@ -94,19 +94,12 @@ class Evaluator:
             det = Counter([cc[0] for cc in gts])
             for key, val in det.items():
                 det[key] = np.zeros(val)
+            # Best ground truth of every detection, IOU matrix is computed once per image
+            iouMaxes, jmaxes = Evaluator._getBestIOUs(dects, gts)
             # print("Evaluating class: %s (%d detections)" % (str(c), len(dects)))
             # Loop through detections
             for d in range(len(dects)):
-                # print('dect %s => %s' % (dects[d][0], dects[d][3],))
-                # Find ground truth image
-                gt = [gt for gt in gts if gt[0] == dects[d][0]]
-                iouMax = sys.float_info.min
-                for j in range(len(gt)):
-                    # print('Ground truth gt => %s' % (gt[j][3],))
-                    iou = Evaluator.iou(dects[d][3], gt[j][3])
-                    if iou > iouMax:
-                        iouMax = iou
-                        jmax = j
+                iouMax, jmax = iouMaxes[d], jmaxes[d]
                 # Assign detection as true positive/don't care/false positive
                 if iouMax >= IOUThreshold:
                     if det[dects[d][0]][jmax] == 0:
@@ -186,181 +179,43 @@ class Evaluator:
             dict['total TP']: total number of True Positive detections;
             dict['total FP']: total number of False Negative detections;
         """
+        # matplotlib is loaded only when a plot is requested
+        from .plotting import plot_precision_recall_curves
         results = self.GetPascalVOCMetrics(boundingBoxes, IOUThreshold, method)
-        result = None
-        # Each resut represents a class
-        for result in results:
-            if result is None:
-                raise IOError('Error: Class %d could not be found.' % classId)
-
-            classId = result['class']
-            precision = result['precision']
-            recall = result['recall']
-            average_precision = result['AP']
-            mpre = result['interpolated precision']
-            mrec = result['interpolated recall']
-            npos = result['total positives']
-            total_tp = result['total TP']
-            total_fp = result['total FP']
-
-            plt.close()
-            if showInterpolatedPrecision:
-                if method == MethodAveragePrecision.EveryPointInterpolation:
-                    plt.plot(mrec, mpre, '--r', label='Interpolated precision (every point)')
-                elif method == MethodAveragePrecision.ElevenPointInterpolation:
-                    # Uncomment the line below if you want to plot the area
-                    # plt.plot(mrec, mpre, 'or', label='11-point interpolated precision')
-                    # Remove duplicates, getting only the highest precision of each recall value
-                    nrec = []
-                    nprec = []
-                    for idx in range(len(mrec)):
-                        r = mrec[idx]
-                        if r not in nrec:
-                            idxEq = np.argwhere(mrec == r)
-                            nrec.append(r)
-                            nprec.append(max([mpre[int(id)] for id in idxEq]))
-                    plt.plot(nrec, nprec, 'or', label='11-point interpolated precision')
-            plt.plot(recall, precision, label='Precision')
-            plt.xlabel('recall')
-            plt.ylabel('precision')
-            if showAP:
-                ap_str = "{0:.2f}%".format(average_precision * 100)
-                # ap_str = "{0:.4f}%".format(average_precision * 100)
-                plt.title('Precision x Recall curve \nClass: %s, AP: %s' % (str(classId), ap_str))
-            else:
-                plt.title('Precision x Recall curve \nClass: %s' % str(classId))
-            plt.legend(shadow=True)
-            plt.grid()
-            ############################################################
-            # Uncomment the following block to create plot with points #
-            ############################################################
-            # plt.plot(recall, precision, 'bo')
-            # labels = ['R', 'Y', 'J', 'A', 'U', 'C', 'M', 'F', 'D', 'B', 'H', 'P', 'E', 'X', 'N', 'T',
-            # 'K', 'Q', 'V', 'I', 'L', 'S', 'G', 'O']
-            # dicPosition = {}
-            # dicPosition['left_zero'] = (-30,0)
-            # dicPosition['left_zero_slight'] = (-30,-10)
-            # dicPosition['right_zero'] = (30,0)
-            # dicPosition['left_up'] = (-30,20)
-            # dicPosition['left_down'] = (-30,-25)
-            # dicPosition['right_up'] = (20,20)
-            # dicPosition['right_down'] = (20,-20)
-            # dicPosition['up_zero'] = (0,30)
-            # dicPosition['up_right'] = (0,30)
-            # dicPosition['left_zero_long'] = (-60,-2)
-            # dicPosition['down_zero'] = (-2,-30)
-            # vecPositions = [
-            #     dicPosition['left_down'],
-            #     dicPosition['left_zero'],
-            #     dicPosition['right_zero'],
-            #     dicPosition['right_zero'],  #'R', 'Y', 'J', 'A',
-            #     dicPosition['left_up'],
-            #     dicPosition['left_up'],
-            #     dicPosition['right_up'],
-            #     dicPosition['left_up'],  # 'U', 'C', 'M', 'F',
-            #     dicPosition['left_zero'],
-            #     dicPosition['right_up'],
-            #     dicPosition['right_down'],
-            #     dicPosition['down_zero'],  #'D', 'B', 'H', 'P'
-            #     dicPosition['left_up'],
-            #     dicPosition['up_zero'],
-            #     dicPosition['right_up'],
-            #     dicPosition['left_up'],  # 'E', 'X', 'N', 'T',
-            #     dicPosition['left_zero'],
-            #     dicPosition['right_zero'],
-            #     dicPosition['left_zero_long'],
-            #     dicPosition['left_zero_slight'],  # 'K', 'Q', 'V', 'I',
-            #     dicPosition['right_down'],
-            #     dicPosition['left_down'],
-            #     dicPosition['right_up'],
-            #     dicPosition['down_zero']
-            # ]  # 'L', 'S', 'G', 'O'
-            # for idx in range(len(labels)):
-            #     box = dict(boxstyle='round,pad=.5',facecolor='yellow',alpha=0.5)
-            #     plt.annotate(labels[idx],
-            #                 xy=(recall[idx],precision[idx]), xycoords='data',
-            #                 xytext=vecPositions[idx], textcoords='offset points',
-            #                 arrowprops=dict(arrowstyle="->", connectionstyle="arc3"),
-            #                 bbox=box)
-            if savePath is not None:
-                plt.savefig(os.path.join(savePath, classId + '.png'))
-            if showGraphic is True:
-                plt.show()
-                # plt.waitforbuttonpress()
-                plt.pause(0.05)
+        plot_precision_recall_curves(results, method, showAP, showInterpolatedPrecision, savePath, showGraphic)
         return results
 
     @staticmethod
     def CalculateAveragePrecision(rec, prec):
-        mrec = []
-        mrec.append(0)
-        [mrec.append(e) for e in rec]
-        mrec.append(1)
-        mpre = []
-        mpre.append(0)
-        [mpre.append(e) for e in prec]
-        mpre.append(0)
-        for i in range(len(mpre) - 1, 0, -1):
-            mpre[i - 1] = max(mpre[i - 1], mpre[i])
-        ii = []
-        for i in range(len(mrec) - 1):
-            if mrec[1:][i] != mrec[0:-1][i]:
-                ii.append(i + 1)
-        ap = 0
-        for i in ii:
-            ap = ap + np.sum((mrec[i] - mrec[i - 1]) * mpre[i])
-        # return [ap, mpre[1:len(mpre)-1], mrec[1:len(mpre)-1], ii]
-        return [ap, mpre[0:len(mpre) - 1], mrec[0:len(mpre) - 1], ii]
+        return every_point_ap(rec, prec)
 
     @staticmethod
     # 11-point interpolated average precision
     def ElevenPointInterpolatedAP(rec, prec):
-        # def CalculateAveragePrecision2(rec, prec):
-        mrec = []
-        # mrec.append(0)
-        [mrec.append(e) for e in rec]
-        # mrec.append(1)
-        mpre = []
-        # mpre.append(0)
-        [mpre.append(e) for e in prec]
-        # mpre.append(0)
-        recallValues = np.linspace(0, 1, 11)
-        recallValues = list(recallValues[::-1])
-        rhoInterp = []
-        recallValid = []
-        # For each recallValues (0, 0.1, 0.2, ... , 1)
-        for r in recallValues:
-            # Obtain all recall values higher or equal than r
-            argGreaterRecalls = np.argwhere(mrec[:] >= r)
-            pmax = 0
-            # If there are recalls above r
-            if argGreaterRecalls.size != 0:
-                pmax = max(mpre[argGreaterRecalls.min():])
-            recallValid.append(r)
-            rhoInterp.append(pmax)
-        # By definition AP = sum(max(precision whose recall is above r))/11
-        ap = sum(rhoInterp) / 11
-        # Generating values for the plot
-        rvals = []
-        rvals.append(recallValid[0])
-        [rvals.append(e) for e in recallValid]
-        rvals.append(0)
-        pvals = []
-        pvals.append(0)
-        [pvals.append(e) for e in rhoInterp]
-        pvals.append(0)
-        # rhoInterp = rhoInterp[::-1]
-        cc = []
-        for i in range(len(rvals)):
-            p = (rvals[i], pvals[i - 1])
-            if p not in cc:
-                cc.append(p)
-            p = (rvals[i], pvals[i])
-            if p not in cc:
-                cc.append(p)
-        recallValues = [i[0] for i in cc]
-        rhoInterp = [i[1] for i in cc]
-        return [ap, rhoInterp, recallValues, None]
+        return eleven_point_ap(rec, prec)
+
+    # For each detection find ground truth of its image with the highest IOU
+    @staticmethod
+    def _getBestIOUs(dects, gts):
+        gtBoxes = {}
+        for g in gts:
+            gtBoxes.setdefault(g[0], []).append(g[3])
+        dectIndices = {}
+        for d, dect in enumerate(dects):
+            dectIndices.setdefault(dect[0], []).append(d)
+        # detections without positive IOU keep sys.float_info.min as in pairwise loop
+        iouMaxes = np.full(len(dects), sys.float_info.min)
+        jmaxes = np.zeros(len(dects), dtype=np.int64)
+        for imageName, indices in dectIndices.items():
+            if imageName not in gtBoxes:
+                continue
+            ious = iou_matrix_xyx2y2([dects[d][3] for d in indices], gtBoxes[imageName])
+            best = ious.argmax(axis=1)
+            bestIOU = ious[np.arange(len(indices)), best]
+            positive = bestIOU > sys.float_info.min
+            iouMaxes[np.array(indices)[positive]] = bestIOU[positive]
+            jmaxes[np.array(indices)[positive]] = best[positive]
+        return iouMaxes, jmaxes
 
     # For each detections, calculate IOU with reference
     @staticmethod
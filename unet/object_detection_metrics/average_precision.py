@@ -0,0 +1,50 @@
+import numpy as np
+
+
+def every_point_ap(rec, prec):
+    """
+    Every point interpolated average precision as in the official PASCAL VOC toolkit.
+    :param rec: np.array(D) - recall of every detection by decreasing confidence
+    :param prec: np.array(D) - precision of every detection by decreasing confidence
+    :return: [ap, interpolated precision, interpolated recall, indices of recall changes],
+             same as `Evaluator.CalculateAveragePrecision`
+    """
+    mrec = np.concatenate(([0], np.asarray(rec, dtype=np.float64), [1]))
+    mpre = np.concatenate(([0], np.asarray(prec, dtype=np.float64), [0]))
+    # precision is made monotonic by running max from the right
+    mpre = np.maximum.accumulate(mpre[::-1])[::-1]
+    ii = np.flatnonzero(mrec[1:] != mrec[:-1]) + 1
+    # cumsum adds in order as the loop did, so the sum is bit-exact
+    ap = np.cumsum((mrec[ii] - mrec[ii - 1]) * mpre[ii])[-1] if len(ii) else 0
+    return [ap, mpre[:-1].tolist(), mrec[:-1].tolist(), ii.tolist()]
+
+
+def eleven_point_ap(rec, prec):
+    """
+    11-point interpolated average precision as described in
+    "The PASCAL Visual Object Classes (VOC) Challenge".
+    :param rec: np.array(D) - recall of every detection by decreasing confidence
+    :param prec: np.array(D) - precision of every detection by decreasing confidence
+    :return: [ap, interpolated precision, recall values, None],
+             same as `Evaluator.ElevenPointInterpolatedAP`
+    """
+    rec = np.asarray(rec, dtype=np.float64)
+    prec = np.asarray(prec, dtype=np.float64)
+    recallValues = np.linspace(0, 1, 11)[::-1]
+    # first detection with recall >= r is found in running max of recall, nan never passes
+    first = np.searchsorted(np.maximum.accumulate(np.where(np.isnan(rec), -np.inf, rec)), recallValues)
+    suffixMax = np.append(np.maximum.accumulate(prec[::-1])[::-1], 0)
+    rhoInterp = suffixMax[first]
+    ap = np.cumsum(rhoInterp)[-1] / 11
+
+    # points of the step plot without duplicates
+    recallValid = recallValues.tolist()
+    rhoInterp = rhoInterp.tolist()
+    rvals = [recallValid[0]] + recallValid + [0]
+    pvals = [0] + rhoInterp + [0]
+    cc = []
+    for i in range(len(rvals)):
+        for p in ((rvals[i], pvals[i - 1]), (rvals[i], pvals[i])):
+            if p not in cc:
+                cc.append(p)
+    return [ap, [p[1] for p in cc], [p[0] for p in cc], None]
@@ -0,0 +1,124 @@
+import os
+
+import matplotlib
+import numpy as np
+
+from .utils import MethodAveragePrecision
+
+# non-interactive backend unless one is chosen explicitly, so plotting works in workers and on servers
+if "MPLBACKEND" not in os.environ:
+    matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+
+
+def plot_precision_recall_curves(results, method=MethodAveragePrecision.EveryPointInterpolation, showAP=False,
+                                 showInterpolatedPrecision=False, savePath=None, showGraphic=True):
+    """
+    Plot the Precision x Recall curve of every class, see `Evaluator.PlotPrecisionRecallCurve`.
+    :param results: list of dicts of every class as returned by `Evaluator.GetPascalVOCMetrics`
+    :param method: MethodAveragePrecision used to compute `results`
+    :param showAP: show average precision in the title
+    :param showInterpolatedPrecision: plot interpolated precision too
+    :param savePath: directory to save `<class>.png` plots to
+    :param showGraphic: show the plot, no-op with the non-interactive backend
+    """
+    # Each resut represents a class
+    for i, result in enumerate(results):
+        if result is None:
+            raise IOError('Error: Class of result %d could not be found.' % i)
+
+        classId = result['class']
+        precision = result['precision']
+        recall = result['recall']
+        average_precision = result['AP']
+        mpre = result['interpolated precision']
+        mrec = result['interpolated recall']
+        npos = result['total positives']
+        total_tp = result['total TP']
+        total_fp = result['total FP']
+
+        plt.close()
+        if showInterpolatedPrecision:
+            if method == MethodAveragePrecision.EveryPointInterpolation:
+                plt.plot(mrec, mpre, '--r', label='Interpolated precision (every point)')
+            elif method == MethodAveragePrecision.ElevenPointInterpolation:
+                # Uncomment the line below if you want to plot the area
+                # plt.plot(mrec, mpre, 'or', label='11-point interpolated precision')
+                # Remove duplicates, getting only the highest precision of each recall value
+                nrec = []
+                nprec = []
+                for idx in range(len(mrec)):
+                    r = mrec[idx]
+                    if r not in nrec:
+                        idxEq = np.argwhere(np.asarray(mrec) == r)
+                        nrec.append(r)
+                        nprec.append(max([mpre[int(id)] for id in idxEq]))
+                plt.plot(nrec, nprec, 'or', label='11-point interpolated precision')
+        plt.plot(recall, precision, label='Precision')
+        plt.xlabel('recall')
+        plt.ylabel('precision')
+        if showAP:
+            ap_str = "{0:.2f}%".format(average_precision * 100)
+            # ap_str = "{0:.4f}%".format(average_precision * 100)
+            plt.title('Precision x Recall curve \nClass: %s, AP: %s' % (str(classId), ap_str))
+        else:
+            plt.title('Precision x Recall curve \nClass: %s' % str(classId))
+        plt.legend(shadow=True)
+        plt.grid()
+        ############################################################
+        # Uncomment the following block to create plot with points #
+        ############################################################
+        # plt.plot(recall, precision, 'bo')
+        # labels = ['R', 'Y', 'J', 'A', 'U', 'C', 'M', 'F', 'D', 'B', 'H', 'P', 'E', 'X', 'N', 'T',
+        # 'K', 'Q', 'V', 'I', 'L', 'S', 'G', 'O']
+        # dicPosition = {}
+        # dicPosition['left_zero'] = (-30,0)
+        # dicPosition['left_zero_slight'] = (-30,-10)
+        # dicPosition['right_zero'] = (30,0)
+        # dicPosition['left_up'] = (-30,20)
+        # dicPosition['left_down'] = (-30,-25)
+        # dicPosition['right_up'] = (20,20)
+        # dicPosition['right_down'] = (20,-20)
+        # dicPosition['up_zero'] = (0,30)
+        # dicPosition['up_right'] = (0,30)
+        # dicPosition['left_zero_long'] = (-60,-2)
+        # dicPosition['down_zero'] = (-2,-30)
+        # vecPositions = [
+        #     dicPosition['left_down'],
+        #     dicPosition['left_zero'],
+        #     dicPosition['right_zero'],
+        #     dicPosition['right_zero'],  #'R', 'Y', 'J', 'A',
+        #     dicPosition['left_up'],
+        #     dicPosition['left_up'],
+        #     dicPosition['right_up'],
+        #     dicPosition['left_up'],  # 'U', 'C', 'M', 'F',
+        #     dicPosition['left_zero'],
+        #     dicPosition['right_up'],
+        #     dicPosition['right_down'],
+        #     dicPosition['down_zero'],  #'D', 'B', 'H', 'P'
+        #     dicPosition['left_up'],
+        #     dicPosition['up_zero'],
+        #     dicPosition['right_up'],
+        #     dicPosition['left_up'],  # 'E', 'X', 'N', 'T',
+        #     dicPosition['left_zero'],
+        #     dicPosition['right_zero'],
+        #     dicPosition['left_zero_long'],
+        #     dicPosition['left_zero_slight'],  # 'K', 'Q', 'V', 'I',
+        #     dicPosition['right_down'],
+        #     dicPosition['left_down'],
+        #     dicPosition['right_up'],
+        #     dicPosition['down_zero']
+        # ]  # 'L', 'S', 'G', 'O'
+        # for idx in range(len(labels)):
+        #     box = dict(boxstyle='round,pad=.5',facecolor='yellow',alpha=0.5)
+        #     plt.annotate(labels[idx],
+        #                 xy=(recall[idx],precision[idx]), xycoords='data',
+        #                 xytext=vecPositions[idx], textcoords='offset points',
+        #                 arrowprops=dict(arrowstyle="->", connectionstyle="arc3"),
+        #                 bbox=box)
+        if savePath is not None:
+            plt.savefig(os.path.join(savePath, classId + '.png'))
+        if showGraphic is True:
+            plt.show()
+            # plt.waitforbuttonpress()
+            plt.pause(0.05)
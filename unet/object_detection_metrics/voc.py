@@ -0,0 +1,322 @@
+import numpy as np
+
+from ..iou import iou_xyx2y2
+from .average_precision import every_point_ap, eleven_point_ap
+from .utils import MethodAveragePrecision
+
+
+def group_pairs(det_boxes, det_groups, gt_boxes, gt_groups):
+    """
+    All (detection, ground truth) pairs of the same group with their iou,
+    pairs of a detection are contiguous.
+    :param det_boxes: np.array(D, 4) - XYX2Y2
+    :param det_groups: np.array(D) - group, e.g. (class, image), of every detection
+    :param gt_boxes: np.array(G, 4) - XYX2Y2
+    :param gt_groups: np.array(G) - sorted groups of ground truths
+    :return: matched - detections with pairs, counts and offsets of their pairs,
+             pair_gt - ground truth of every pair, ious - iou of every pair
+    """
+    start = np.searchsorted(gt_groups, det_groups, side="left")
+    counts = np.searchsorted(gt_groups, det_groups, side="right") - start
+    matched = np.flatnonzero(counts)
+    counts = counts[matched]
+    offsets = np.cumsum(counts) - counts
+    pair_det = np.repeat(matched, counts)
+    pair_gt = np.repeat(start[matched] - offsets, counts) + np.arange(counts.sum())
+    ious = iou_xyx2y2(det_boxes[pair_det], gt_boxes[pair_gt])
+    return matched, counts, offsets, pair_gt, ious
+
+
+def best_of_pairs(detections, pairs, ious=None):
+    """
+    Ground truth with the highest iou for every detection,
+    the first one of equal candidates wins as in `Evaluator.GetPascalVOCMetrics`.
+    :param detections: amount of detections
+    :param pairs: result of `group_pairs`
+    :param ious: iou of every pair to use instead of `pairs` ones, e.g. with some pairs masked by -1
+    :return: best_iou - np.array(D), 0 when detection has no pairs,
+             best_gt - np.array(D) index of ground truth, -1 when detection has no pairs
+    """
+    matched, counts, offsets, pair_gt, pair_ious = pairs
+    if ious is None:
+        ious = pair_ious
+    best_iou = np.zeros(detections)
+    best_gt = np.full(detections, -1, dtype=np.int64)
+    if len(matched) == 0:
+        return best_iou, best_gt
+
+    max_iou = np.maximum.reduceat(ious, offsets)
+    indices = np.arange(len(ious))
+    first = np.minimum.reduceat(np.where(ious == np.repeat(max_iou, counts), indices, len(indices)), offsets)
+    best_iou[matched] = max_iou
+    best_gt[matched] = pair_gt[first]
+    return best_iou, best_gt
+
+
+def best_ground_truths(det_boxes, det_groups, gt_boxes, gt_groups):
+    """
+    For every detection find ground truth of the same group with the highest iou,
+    see `group_pairs` and `best_of_pairs`.
+    """
+    return best_of_pairs(len(det_groups), group_pairs(det_boxes, det_groups, gt_boxes, gt_groups))
+
+
+def sort_boxes(images, classes, confidences, is_gt):
+    """
+    :return: class_values - np.array(K) sorted classes, class_ids - np.array(N) index of class of every box,
+             groups - np.array(N) (class, image) group of every box,
+             gt - ground truths sorted by group, det - detections sorted by class and decreasing confidence
+    """
+    class_values, class_ids = np.unique(classes, return_inverse=True)
+    _, image_ids = np.unique(images, return_inverse=True)
+    groups = class_ids.astype(np.int64) * (image_ids.max() + 1) + image_ids
+
+    # both sorts are stable to keep order of equal boxes
+    gt = np.flatnonzero(is_gt)
+    gt = gt[np.argsort(groups[gt], kind="stable")]
+    det = np.flatnonzero(~is_gt)
+    det = det[np.lexsort((-confidences[det], class_ids[det]))]
+    return class_values, class_ids, groups, gt, det
+
+
+def true_positives(best_iou, best_gt, iou_threshold):
+    """
+    The first detection of a ground truth is true positive, the others are duplicates.
+    :return: TP - np.array(D) of 0/1, valid - detections with iou not lower than threshold
+    """
+    valid = (best_iou > 0) & (best_iou >= iou_threshold)
+    matched = np.flatnonzero(valid)
+    _, first = np.unique(best_gt[matched], return_index=True)
+    TP = np.zeros(len(best_iou))
+    TP[matched[first]] = 1
+    return TP, valid
+
+
+def match_boxes(images, classes, confidences, is_gt, boxes, iou_threshold=0.5):
+    """
+    Mark every detection as true or false positive as `Evaluator.GetPascalVOCMetrics` does.
+    :return: class_values - np.array(K) sorted classes,
+             det_classes - np.array(D) class index of every detection, sorted,
+             det_confidences - np.array(D) decreasing within every class,
+             TP - np.array(D) of 0/1,
+             npos - np.array(K) amount of ground truths of every class
+    """
+    class_values, class_ids, groups, gt, det = sort_boxes(images, classes, confidences, is_gt)
+    best_iou, best_gt = best_ground_truths(boxes[det], groups[det], boxes[gt], groups[gt])
+    TP, _ = true_positives(best_iou, best_gt, iou_threshold)
+    npos = np.bincount(class_ids[gt], minlength=len(class_values))
+    return class_values, class_ids[det], confidences[det], TP, npos
+
+
+def class_metrics(c, TP, npos, method=MethodAveragePrecision.EveryPointInterpolation):
+    """
+    :param c: class
+    :param TP: np.array(D) of 0/1 for detections of the class by decreasing confidence
+    :param npos: amount of ground truths of the class
+    :return: dict of the class as in `Evaluator.GetPascalVOCMetrics`, None when AP is undefined
+    """
+    FP = 1 - TP
+    acc_FP = np.cumsum(FP)
+    acc_TP = np.cumsum(TP)
+    rec = acc_TP / npos
+    prec = np.divide(acc_TP, (acc_FP + acc_TP))
+    if method == MethodAveragePrecision.EveryPointInterpolation:
+        [ap, mpre, mrec, _] = every_point_ap(rec, prec)
+    else:
+        [ap, mpre, mrec, _] = eleven_point_ap(rec, prec)
+    if np.isnan(ap):
+        return None
+    return {
+        'class': c,
+        'precision': prec,
+        'recall': rec,
+        'AP': ap,
+        'interpolated precision': mpre,
+        'interpolated recall': mrec,
+        'total positives': int(npos),
+        'total TP': np.sum(TP),
+        'total FP': np.sum(FP)
+    }
+
+
+def voc_metrics(images, classes, confidences, is_gt, boxes, iou_threshold=0.5,
+                method=MethodAveragePrecision.EveryPointInterpolation):
+    """
+    Vectorized `Evaluator.GetPascalVOCMetrics` over columns of boxes, see `BoundingBoxes.arrays`.
+    :return: list of dicts of every class, same as `Evaluator.GetPascalVOCMetrics`
+    """
+    if len(classes) == 0:
+        return []
+    class_values, det_classes, _, TP, npos = match_boxes(images, classes, confidences, is_gt, boxes,
+                                                         iou_threshold)
+    det_offsets = np.searchsorted(det_classes, np.arange(len(class_values) + 1))
+    ret = []
+    for k, c in enumerate(class_values):
+        r = class_metrics(c, TP[det_offsets[k]:det_offsets[k + 1]], npos[k], method)
+        if r is not None:
+            ret.append(r)
+    return ret
+
+
+def pascal_voc_metrics(boundingboxes, iou_threshold=0.5, method=MethodAveragePrecision.EveryPointInterpolation):
+    """
+    Same as `Evaluator().GetPascalVOCMetrics(boundingboxes, iou_threshold, method)`.
+    :param boundingboxes: BoundingBoxes
+    """
+    return voc_metrics(*boundingboxes.arrays(), iou_threshold=iou_threshold, method=method)
+
+
+COCO_THRESHOLDS = np.linspace(0.5, 0.95, 10)
+
+
+def box_areas(boxes):
+    """
+    :param boxes: np.array(N, 4) - XYX2Y2, borders are inclusive as in iou
+    """
+    return (boxes[:, 2] - boxes[:, 0] + 1) * (boxes[:, 3] - boxes[:, 1] + 1)
+
+
+def coco_metrics(images, classes, confidences, is_gt, boxes, iou_thresholds=COCO_THRESHOLDS, area_ranges=None,
+                 method=MethodAveragePrecision.EveryPointInterpolation):
+    """
+    Pascal VOC metrics for several iou thresholds and area ranges in one pass:
+    iou of every (detection, ground truth) pair is computed once.
+    As in COCO evaluation, ground truths out of area range are ignored,
+    so are detections matched to them and unmatched detections out of range.
+    With one range of all areas AP of every threshold equals `voc_metrics`.
+    :param iou_thresholds: T thresholds, .5:.95 by default
+    :param area_ranges: dict name -> (min area, max area), min inclusive, max exclusive,
+    e.g. {"all": (0, np.inf), "small": (0, 32 ** 2)}, all areas by default
+    :return: list of dicts of every area range and class with keys
+             'area', 'class', 'total positives', 'AP' - np.array(T), nan when undefined,
+             'total TP' - np.array(T), 'total FP' - np.array(T)
+    """
+    if area_ranges is None:
+        area_ranges = {"all": (0, np.inf)}
+    if len(classes) == 0:
+        return []
+    class_values, class_ids, groups, gt, det = sort_boxes(images, classes, confidences, is_gt)
+    pairs = group_pairs(boxes[det], groups[det], boxes[gt], groups[gt])
+    _, _, _, pair_gt, ious = pairs
+    det_offsets = np.searchsorted(class_ids[det], np.arange(len(class_values) + 1))
+    gt_areas = box_areas(boxes[gt])
+    det_areas = box_areas(boxes[det])
+
+    ret = []
+    for area, (min_area, max_area) in area_ranges.items():
+        gt_in_range = (gt_areas >= min_area) & (gt_areas < max_area)
+        det_in_range = (det_areas >= min_area) & (det_areas < max_area)
+        # ignored ground truths are matched only when there is no other candidate
+        pair_in_range = gt_in_range[pair_gt]
+        best_iou, best_gt = best_of_pairs(len(det), pairs, np.where(pair_in_range, ious, -1))
+        ignored_iou, _ = best_of_pairs(len(det), pairs, np.where(pair_in_range, -1, ious))
+        npos = np.bincount(class_ids[gt][gt_in_range], minlength=len(class_values))
+
+        TPs, FPs, APs = [], [], []
+        for iou_threshold in iou_thresholds:
+            TP, valid = true_positives(best_iou, best_gt, iou_threshold)
+            ignored = ~valid & (((ignored_iou > 0) & (ignored_iou >= iou_threshold)) | ~det_in_range)
+            class_TP, class_FP, class_AP = [], [], []
+            for k, c in enumerate(class_values):
+                detections = slice(det_offsets[k], det_offsets[k + 1])
+                r = class_metrics(c, TP[detections][~ignored[detections]], npos[k], method)
+                class_AP.append(np.nan if r is None else r['AP'])
+                class_TP.append(np.nan if r is None else r['total TP'])
+                class_FP.append(np.nan if r is None else r['total FP'])
+            TPs.append(class_TP)
+            FPs.append(class_FP)
+            APs.append(class_AP)
+
+        for k, c in enumerate(class_values):
+            AP = np.array([class_AP[k] for class_AP in APs])
+            if np.isnan(AP).all():
+                continue
+            ret.append({
+                'area': area,
+                'class': c,
+                'total positives': int(npos[k]),
+                'AP': AP,
+                'total TP': np.array([class_TP[k] for class_TP in TPs]),
+                'total FP': np.array([class_FP[k] for class_FP in FPs])
+            })
+    return ret
+
+
+def coco_summary(results, iou_thresholds=COCO_THRESHOLDS):
+    """
+    :param results: result of `coco_metrics`
+    :return: dict area range -> dict of mAP over classes and thresholds, AP50 and AP75
+    """
+    summary = dict()
+    for area in dict.fromkeys(r['area'] for r in results):
+        AP = np.array([r['AP'] for r in results if r['area'] == area])
+        summary[area] = {
+            'mAP': np.nanmean(AP),
+            'AP50': np.nanmean(AP[:, np.isclose(iou_thresholds, 0.5)]),
+            'AP75': np.nanmean(AP[:, np.isclose(iou_thresholds, 0.75)]),
+        }
+    return summary
+
+class APAccumulator(object):
+    """
+    Streaming Pascal VOC metrics. Boxes of every batch are matched when added and only
+    confidence and true positive flag of detections are kept per class.
+    Results are equal to `pascal_voc_metrics` of all added boxes
+    as long as boxes of one image are added in one batch.
+    """
+    def __init__(self, iou_threshold=0.5, method=MethodAveragePrecision.EveryPointInterpolation):
+        self.iou_threshold = iou_threshold
+        self.method = method
+        # class -> amount of ground truths
+        self.npos = dict()
+        # class -> list of (confidences, TP) chunks, each sorted by decreasing confidence
+        self.chunks = dict()
+
+    def add(self, boundingboxes):
+        """
+        :param boundingboxes: BoundingBoxes of a batch
+        """
+        self.add_arrays(*boundingboxes.arrays())
+
+    def add_arrays(self, images, classes, confidences, is_gt, boxes):
+        if len(classes) == 0:
+            return
+        class_values, det_classes, det_confidences, TP, npos = match_boxes(images, classes, confidences,
+                                                                           is_gt, boxes, self.iou_threshold)
+        det_offsets = np.searchsorted(det_classes, np.arange(len(class_values) + 1))
+        for k, c in enumerate(class_values.tolist()):
+            detections = slice(det_offsets[k], det_offsets[k + 1])
+            self.npos[c] = self.npos.get(c, 0) + int(npos[k])
+            self.chunks.setdefault(c, []).append((det_confidences[detections], TP[detections]))
+
+    def _merged(self, c):
+        chunks = self.chunks[c]
+        if len(chunks) > 1:
+            confidences = np.concatenate([chunk[0] for chunk in chunks])
+            TP = np.concatenate([chunk[1] for chunk in chunks])
+            # stable sort keeps earlier chunks first among equal confidences
+            order = np.argsort(-confidences, kind="stable")
+            chunks[:] = [(confidences[order], TP[order])]
+        return chunks[0]
+
+    def merge(self, other):
+        """
+        Add boxes of another accumulator, e.g. of another worker process.
+        """
+        for c, npos in other.npos.items():
+            self.npos[c] = self.npos.get(c, 0) + npos
+        for c, chunks in other.chunks.items():
+            self.chunks.setdefault(c, []).extend(chunks)
+
+    def result(self):
+        """
+        Metrics of boxes added so far.
+        :return: list of dicts of every class, same as `pascal_voc_metrics`
+        """
+        ret = []
+        for c in sorted(self.chunks):
+            _, TP = self._merged(c)
+            r = class_metrics(c, TP, self.npos[c], self.method)
+            if r is not None:
+                ret.append(r)
+        return ret
@@ -1,130 +1,222 @@
-import collections
+import functools
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
 
-import cv2
 import torch
 import numpy as np
+from torchvision.ops import roi_align
+from scipy import ndimage
 from skimage import measure
 
-from .iou import bb_intersection_over_union_numpy
+from utils.integral import integral_image, projection_profiles
+from .iou import match_rectangles
+
+
+def extract_masks_rects(mask, return_masks=True):
+    """
+    Find connected components of every class with one labelling pass.
+    Components are ordered by class, then by position of their first pixel.
+    :param mask: np.array(H, W) - class of every pixel, 0 is background
+    :param return_masks: build full-size mask of bounding box of every component
+    :return: masks - list of np.array(H, W) or None, rectangles - list of (x, y, w, h), classes
+    """
+    # neighbouring pixels of different classes get different labels
+    labeled_mask, count = measure.label(mask, background=0, return_num=True, connectivity=2)
+    component_class = np.zeros(count + 1, dtype=mask.dtype)
+    component_class[labeled_mask.ravel()] = mask.ravel()
+    component_class = component_class[1:]
+    slices = ndimage.find_objects(labeled_mask)
 
-
-def extract_masks_rects(mask):
     rectangles = []
-    masks = []
     classes = []
-    for class_id in np.unique(mask):
-        if class_id == 0:
-            continue
-        labeled_mask = measure.label(mask == class_id, background=0)
-        for i in np.unique(labeled_mask):
-            if i == 0:
-                continue
-            classes.append(class_id)
-
-            i_mask = labeled_mask == i
-            contours, _ = cv2.findContours(i_mask.astype(np.uint8), 1, 2)
-            biggest_cntr = max(contours, key=cv2.contourArea)
-            rect = cv2.boundingRect(biggest_cntr)
-            rectangles.append(rect)
-
-            x, y, w, h = rect
-            i_mask = np.zeros_like(i_mask)
-            i_mask[y:y + h, x:x + w] = True
+    masks = [] if return_masks else None
+    for i in np.argsort(component_class, kind="stable"):
+        y_slice, x_slice = slices[i]
+        rect = (x_slice.start, y_slice.start, x_slice.stop - x_slice.start, y_slice.stop - y_slice.start)
+        rectangles.append(rect)
+        classes.append(component_class[i])
+        if return_masks:
+            i_mask = np.zeros(mask.shape, dtype=bool)
+            i_mask[y_slice, x_slice] = True
             masks.append(i_mask)
     return masks, rectangles, classes
 
 
-def process_entry_numpy(in_img, pred_mask, true_mask, filter_masks=True):
+PROJECTIONS = "projections"
+RECTANGLES = "rectangles"
+CLASSES = "classes"
+TRUE_PRED = "true_pred"
+ALL_OUTPUTS = (PROJECTIONS, RECTANGLES, CLASSES, TRUE_PRED)
+
+
+def split_true_boxes(boxes, classes, counts):
+    """
+    Unpad ground-truth boxes collated by `datasets.collate_pages`.
+    :param boxes: np.array(B, M, 4) - (x, y, w, h)
+    :param classes: np.array(B, M)
+    :param counts: np.array(B)
+    :return: list of (rectangles, classes) of every image
+    """
+    return [(boxes[i, :n].tolist(), classes[i, :n].tolist()) for i, n in enumerate(counts)]
+
+
+def process_entry_numpy(in_img, pred_mask, true_mask, filter_masks=True, outputs=ALL_OUTPUTS, true_boxes=None):
+    """
+    Find predicted regions of one image and match them with true regions.
+    :param outputs: names of needed outputs, others are returned as None
+    :param true_boxes: precomputed (rectangles, classes) of `true_mask`
+    :return: projections, rectangles, classes, true_obj_pred_obj_map,
+    rectangles are always returned as they define amount of regions
+    """
     assert len(in_img.shape) == 2
-    _, pred_rectangles, _ = extract_masks_rects(pred_mask)
-    _, true_rectangles, true_classes = extract_masks_rects(true_mask)
-
-    pred_classes = [0] * len(pred_rectangles)
-    pred_true_iou = [0.5] * len(pred_rectangles)
-    true_indices = [-1] * len(pred_rectangles)
-    for rect_i, rect in enumerate(pred_rectangles):
-        for true_obj_i, (class_id, true_rect) in enumerate(zip(true_classes, true_rectangles)):
-            iou = bb_intersection_over_union_numpy(rect, true_rect)
-            if iou >= pred_true_iou[rect_i]:
-                pred_classes[rect_i] = class_id
-                pred_true_iou[rect_i] = iou
-                true_indices[rect_i] = true_obj_i
-
-    projections = []
+    _, pred_rectangles, _ = extract_masks_rects(pred_mask, return_masks=False)
+    match = filter_masks or CLASSES in outputs or TRUE_PRED in outputs
+    if match:
+        if true_boxes is None:
+            _, true_rectangles, true_classes = extract_masks_rects(true_mask, return_masks=False)
+        else:
+            true_rectangles, true_classes = true_boxes
+        true_indices, pred_true_iou = match_rectangles(pred_rectangles, true_rectangles, threshold=0.5)
+        pred_classes = [true_classes[i] if i >= 0 else 0 for i in true_indices]
+        true_indices, pred_true_iou = true_indices.tolist(), pred_true_iou.tolist()
+    else:
+        pred_classes = [0] * len(pred_rectangles)
+
     classes = []
     rectangles = []
-    in_img = in_img.astype(np.float)
     is_filtered = [True] * len(pred_rectangles)
     for index, (class_id, pred_rect) in enumerate(zip(pred_classes, pred_rectangles)):
         if class_id == 0 and filter_masks:
             continue
         is_filtered[index] = False
         classes.append(class_id - 1)
-        x, y, w, h = pred_rect
-        patch = cv2.resize(in_img[y:y+h, x:x+w], (100, 100))
-        x_projection = patch.sum(0)
-        y_projection = patch.sum(1)
-        projections.append([[x_projection], [y_projection]])
         rectangles.append(pred_rect)
 
-    pred_true_iou = [iou for i, iou in enumerate(pred_true_iou) if is_filtered[i] is False]
-    true_indices = [index for i, index in enumerate(true_indices) if is_filtered[i] is False]
-    true_obj_pred_obj_map = [-1] * len(true_classes)
-    for pred_obj_index in np.argsort(pred_true_iou):
-        true_obj_index = true_indices[pred_obj_index]
-        if true_obj_index > -1:
-            true_obj_pred_obj_map[true_obj_index] = pred_obj_index
-
+    projections = None
+    if PROJECTIONS in outputs:
+        x_projections, y_projections = projection_profiles(integral_image(in_img), rectangles, bins=100)
+        projections = [[[x_projection], [y_projection]]
+                       for x_projection, y_projection in zip(x_projections, y_projections)]
+
+    true_obj_pred_obj_map = None
+    if TRUE_PRED in outputs:
+        pred_true_iou = [iou for i, iou in enumerate(pred_true_iou) if is_filtered[i] is False]
+        true_indices = [index for i, index in enumerate(true_indices) if is_filtered[i] is False]
+        true_obj_pred_obj_map = [-1] * len(true_classes)
+        for pred_obj_index in np.argsort(pred_true_iou):
+            true_obj_index = true_indices[pred_obj_index]
+            if true_obj_index > -1:
+                true_obj_pred_obj_map[true_obj_index] = pred_obj_index
+
+    if CLASSES not in outputs:
+        classes = None
     return projections, rectangles, classes, true_obj_pred_obj_map
 
 
-def process_batch_numpy(in_img, pred_mask, label_mask, filter_masks=True):
+def create_pool(backend="thread", workers=None):
+    """
+    Pool for per-image post-processing in `process_batch_numpy`.
+    Threads share the batch arrays, processes have to pickle them for every image.
+    :param backend: "thread", "process" or "serial"
+    :param workers: amount of workers, cpu count by default
+    :return: concurrent.futures executor or None for serial processing
+    """
+    if backend == "serial":
+        return None
+    if backend == "thread":
+        return ThreadPoolExecutor(workers)
+    if backend == "process":
+        return ProcessPoolExecutor(workers)
+    raise ValueError("Unknown post-processing backend: {}".format(backend))
+
+
+def _process_entry(in_img, pred_mask, true_mask, true_boxes, filter_masks, outputs):
+    return process_entry_numpy(in_img, pred_mask, true_mask, filter_masks, outputs, true_boxes)
+
+
+def process_batch_numpy(in_img, pred_mask, label_mask, filter_masks=True, pool=None, outputs=ALL_OUTPUTS,
+                        true_boxes=None):
+    """
+    :param outputs: names of needed outputs, see `process_entry_numpy`, others are returned as None
+    :param true_boxes: list of precomputed (rectangles, classes) of every label mask, see `split_true_boxes`
+    :return: projections, rectangles, classes, image_index, true_pred
+    """
     assert len(pred_mask.shape) == 3
     assert len(label_mask.shape) == 3
     N = pred_mask.shape[0]
+    if true_boxes is None:
+        true_boxes = [None] * N
+
+    process = functools.partial(_process_entry, filter_masks=filter_masks, outputs=outputs)
+    if pool is None:
+        entries = map(process, in_img, pred_mask, label_mask, true_boxes)
+    else:
+        # results are in order of images
+        entries = pool.map(process, in_img, pred_mask, label_mask, true_boxes)
 
     projections, classes, rectangles, image_index, true_pred = [], [], [], [], []
-    for i in range(N):
-        i_projections, i_rectangles, i_classes, i_true_pred = process_entry_numpy(in_img[i],
-                                                                     pred_mask[i],
-                                                                     label_mask[i],
-                                                                     filter_masks)
-        projections += i_projections
-        classes += i_classes
+    for i, (i_projections, i_rectangles, i_classes, i_true_pred) in enumerate(entries):
         rectangles += i_rectangles
-        image_index += [i] * len(i_classes)
-        true_pred += i_true_pred
-    projections = np.array(projections, dtype=np.float)
-    classes = np.array(classes, dtype=np.int)
-    rectangles = np.array(rectangles, dtype=np.int)
-    true_pred = np.array(true_pred, dtype=np.int)
+        image_index += [i] * len(i_rectangles)
+        if PROJECTIONS in outputs:
+            projections += i_projections
+        if CLASSES in outputs:
+            classes += i_classes
+        if TRUE_PRED in outputs:
+            true_pred += i_true_pred
+    projections = np.array(projections, dtype=np.float) if PROJECTIONS in outputs else None
+    classes = np.array(classes, dtype=np.int) if CLASSES in outputs else None
+    rectangles = np.array(rectangles, dtype=np.int) if RECTANGLES in outputs else None
+    true_pred = np.array(true_pred, dtype=np.int) if TRUE_PRED in outputs else None
     return projections, rectangles, classes, image_index, true_pred
 
 
-def process_batch_torch_wrap(batch_img, batch_pred, batch_mask, filter_masks=True):
+def process_batch_torch_wrap(batch_img, batch_pred, batch_mask, filter_masks=True, pool=None,
+                             outputs=ALL_OUTPUTS, true_boxes=None):
+    """
+    :param true_boxes: (boxes, box classes, box counts) collated by `datasets.collate_pages`,
+    ground truth is extracted from `batch_mask` if not given
+    """
     batch_img = batch_img.detach().squeeze(1).numpy()
     batch_pred = batch_pred.detach().squeeze(1).numpy()
     batch_mask = batch_mask.detach().numpy()
+    if true_boxes is not None:
+        true_boxes = split_true_boxes(*(tensor.detach().cpu().numpy() for tensor in true_boxes))
     projections, rectangles, classes, image_index, true_pred = process_batch_numpy(batch_img,
                                                            batch_pred,
                                                            batch_mask,
-                                                           filter_masks)
-    projections = torch.from_numpy(projections).float()
-    classes = torch.from_numpy(classes).long()
-    rectangles = torch.from_numpy(rectangles).long()
-    true_pred = torch.from_numpy(true_pred).long()
+                                                           filter_masks,
+                                                           pool,
+                                                           outputs,
+                                                           true_boxes)
+    if projections is not None:
+        projections = torch.from_numpy(projections).float()
+    if classes is not None:
+        classes = torch.from_numpy(classes).long()
+    if rectangles is not None:
+        rectangles = torch.from_numpy(rectangles).long()
+    if true_pred is not None:
+        true_pred = torch.from_numpy(true_pred).long()
 
     return projections, rectangles, classes, image_index, true_pred
 
 
-def process_patches(batch_img, rectangles, indices):
-    batch_img = batch_img.cpu().detach().numpy()
-    resized_patches = []
-    for index, rect in zip(indices, rectangles):
-        img = batch_img[index]
-        x, y, w, h = rect
-        patch = img[0, y:y+h, x:x+w]
-        patch = cv2.resize(patch, (128, 32))
-        resized_patches.append(patch)
-    resized_patches = np.array(resized_patches)
-    return torch.from_numpy(resized_patches).unsqueeze(1)
+def process_patches(batch_img, rectangles, indices, size=(128, 32)):
+    """
+    Crop rectangles from the batch and resize them with RoIAlign, on the device of `batch_img`.
+    Sampling points are the same as in cv2.resize of the cropped patch with bilinear interpolation,
+    but points within half a pixel of the patch border interpolate with the neighbouring image pixels,
+    where cv2.resize repeats the edge pixels of the crop, so only values away from the border are equal.
+    :param batch_img: torch.Tensor(B, C, H, W)
+    :param rectangles: torch.Tensor(N, 4) - (x, y, w, h)
+    :param indices: list(N) - image index of every rectangle
+    :param size: (width, height) of patches
+    :return: torch.Tensor(N, 1, height, width) - patches of the first channel
+    """
+    batch_img = batch_img.detach()[:, :1]
+    rectangles = torch.as_tensor(rectangles, device=batch_img.device).to(batch_img.dtype).reshape(-1, 4)
+    indices = torch.as_tensor(indices, device=batch_img.device).to(batch_img.dtype).reshape(-1, 1)
+    # (image_index, x1, y1, x2, y2)
+    boxes = torch.cat((indices, rectangles[:, :2], rectangles[:, :2] + rectangles[:, 2:]), dim=1)
+    return roi_align(batch_img, boxes, output_size=(size[1], size[0]),
+                     spatial_scale=1.0, sampling_ratio=1, aligned=True)
+
@@ -0,0 +1,90 @@
+import argparse
+import json
+import os
+
+import numpy as np
+from tqdm import tqdm
+
+from utils.index import list_annotations, parse_sources, source_entry
+from .datasets import MaskDataset
+
+INDEX_FILE = "index.json"
+IMAGES_FILE = "images.npy"
+MASKS_FILE = "masks.npy"
+
+
+def pack(in_path, out_path, categories=("text", "maths", "separator"), size=(736, 1024),
+         reduced_decode=False):
+    """
+    Pack annotated folder into fixed-size uint8 image and class-mask arrays.
+    :param in_path: entry of YAML `data.list`, supervisely folder or {path, format},
+                    see `utils.index.parse_sources`
+    :param out_path: output folder
+    :param categories: rendered categories
+    :param size: (width, height) of packed pages
+    :param reduced_decode: decode grayscale at reduced scale, see MaskDataset
+    """
+    os.makedirs(out_path, exist_ok=True)
+    (source, in_path), = parse_sources([in_path])
+    files = sorted(list_annotations(source, in_path))
+    dataset = MaskDataset(files, categories=categories, size=size, reduced_decode=reduced_decode,
+                          sources=[source] * len(files))
+
+    width, height = size
+    shape = (len(files), height, width)
+    images = np.lib.format.open_memmap(os.path.join(out_path, IMAGES_FILE), mode="w+",
+                                       dtype=np.uint8, shape=shape)
+    masks = np.lib.format.open_memmap(os.path.join(out_path, MASKS_FILE), mode="w+",
+                                      dtype=np.uint8, shape=shape)
+    for index in tqdm(range(len(dataset)), desc="pack"):
+        images[index], masks[index] = dataset.load_page(index)
+    images.flush()
+    masks.flush()
+    del images, masks
+
+    index = {"files": files, "categories": sorted(categories), "size": list(size)}
+    with open(os.path.join(out_path, INDEX_FILE), "w") as f:
+        json.dump(index, f)
+
+
+class ShardDataset(MaskDataset):
+    """
+    MaskDataset over folder created by `pack`, pages are served as np.memmap slices.
+    Other MaskDataset options, e.g. `return_boxes` and `crops_per_page`, are passed through `kwargs`.
+    """
+    def __init__(self, path, transform_img=None, transform_mask=None, augmentations=None, **kwargs):
+        with open(os.path.join(path, INDEX_FILE)) as f:
+            index = json.load(f)
+        super().__init__(index["files"], categories=index["categories"],
+                         transform_img=transform_img, transform_mask=transform_mask,
+                         augmentations=augmentations, size=index["size"], **kwargs)
+        self.path = path
+        self.images = None
+        self.masks = None
+
+    def __getstate__(self):
+        # memmaps are opened lazily in each DataLoader worker
+        state = self.__dict__.copy()
+        state["images"] = None
+        state["masks"] = None
+        return state
+
+    def load_page(self, index):
+        if self.images is None:
+            self.images = np.load(os.path.join(self.path, IMAGES_FILE), mmap_mode="r")
+            self.masks = np.load(os.path.join(self.path, MASKS_FILE), mmap_mode="r")
+        return self.images[index], self.masks[index]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pack annotated folder into memory-mapped arrays")
+    parser.add_argument("in_path", type=source_entry,
+                        help="supervisely folder or SOURCE:PATH, e.g. impact:_data/impact")
+    parser.add_argument("out_path", help="output folder")
+    parser.add_argument("--categories", nargs="+", default=["text", "maths", "separator"])
+    parser.add_argument("--size", nargs=2, type=int, default=[736, 1024], metavar=("WIDTH", "HEIGHT"))
+    parser.add_argument("--reduced-decode", action="store_true",
+                        help="decode grayscale at reduced scale, same as data.reduced_decode")
+    args = parser.parse_args()
+    pack(args.in_path, args.out_path, categories=args.categories, size=args.size,
+         reduced_decode=args.reduced_decode)
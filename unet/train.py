@@ -1,6 +1,7 @@
 import random
 import os
 import shutil
+import time
 
 import torch
 import torch.utils.data as data_utils
@@ -36,13 +37,18 @@ from albumentations import (
 )
 
 from utils.region import Region
-from .datasets import MaskDataset
+from utils.index import list_annotations, open_index, parse_sources
+from .datasets import MaskDataset, collate_pages
+from .cache import PageCache
 from .collector import Collector
-from .metrics import iou_pytorch, accuracy_wrapper, special_accuracy, mAP_wrapper, BoundingBoxes, maP_create_boxes, mAP_wrapper_from_boxes
-from .projections import process_batch_torch_wrap, process_patches
+from .metrics import iou_pytorch, accuracy_wrapper, special_accuracy, mAP_wrapper, maP_create_boxes, APAccumulator
+from .projections import process_batch_torch_wrap, process_patches, create_pool, RECTANGLES, CLASSES, TRUE_PRED
 
 
 class Trainer(object):
+    # projections are not used by the patch classifier
+    POSTPROCESS_OUTPUTS = (RECTANGLES, CLASSES, TRUE_PRED)
+
     def __init__(self, exp_path, config, device):
         self.exp_path = exp_path
         self.device = device
@@ -55,6 +61,8 @@ class Trainer(object):
         self.optim = self.load_optim()
         self.writer = self.init_board()
         self.metrics = self.init_metrics()
+        self.loaders = dict()
+        self.pool = create_pool(**self.config.get("postprocess", dict()))
 
     def init_metrics(self):
         metrics = dict()
@@ -98,37 +106,88 @@ class Trainer(object):
         config = self.config["data"]
         aug = self.init_augmentations()
 
+        sources = parse_sources(config["list"])
+        test_sources = parse_sources(self.config["test"]["list"])
+        index = None
+        if config.get("index"):
+            index = open_index(config["index"], sources + test_sources)
+
+        def list_files(source, in_path):
+            if index is not None:
+                files = list(index["annotation"][index.pages_in(in_path)])
+            else:
+                files = list_annotations(source, in_path)
+            return [(source, file) for file in files]
+
         files = []
-        for in_path in config["list"]:
-            in_path = os.path.join(in_path, MaskDataset.ANNOTATION_FOLDER)
-            files += list(os.path.join(in_path, fn) for fn in os.listdir(in_path))
+        for source, in_path in sources:
+            files += list_files(source, in_path)
 
         random.seed(config["seed"])
         random.shuffle(files)
         train_files = files[:int(len(files) * config["train_fraction"])]
         val_files = files[len(train_files):]
 
-        in_path = self.config["test"]["list"][0]
-        in_path = os.path.join(in_path, MaskDataset.ANNOTATION_FOLDER)
-        test_files = list(os.path.join(in_path, fn) for fn in os.listdir(in_path))
+        test_files = list_files(*test_sources[0])
+
+        cache = PageCache(config["cache"]) if config.get("cache") else None
+        params = dict(cache=cache, reduced_decode=config.get("reduced_decode", False), index=index,
+                      return_boxes=True)
 
-        train_dset = MaskDataset(train_files, augmentations=aug)
-        val_dset = MaskDataset(val_files)
-        test_dset = MaskDataset(test_files)
+        def dataset(files, **kwargs):
+            return MaskDataset([file for _, file in files], sources=[source for source, _ in files], **kwargs)
+
+        train_dset = dataset(train_files, augmentations=aug,
+                             crops_per_page=self.config["train"].get("crops_per_page", 1), **params)
+        val_dset = dataset(val_files, **params)
+        test_dset = dataset(test_files, **params)
         return train_dset, val_dset, test_dset
 
+    def get_loader(self, name, data, batchsize, shuffle=False):
+        """
+        Long-lived DataLoader per split, workers are kept between epochs.
+        Batch has `batchsize` samples, for datasets with several crops per page
+        it is built from `batchsize // crops_per_page` pages.
+        There is one loader per split, so `shuffle` of the first call is kept:
+        the metrics pass over train data reuses the shuffled training loader,
+        accumulated metrics do not depend on the order of batches.
+        """
+        key = (name, id(data), batchsize)
+        if key not in self.loaders:
+            config = self.config.get("loader", dict())
+            params = dict(num_workers=config.get("workers", 8),
+                          pin_memory=config.get("pin_memory", True) and str(self.device).startswith("cuda"))
+            if params["num_workers"] > 0:
+                params["persistent_workers"] = config.get("persistent_workers", True)
+                params["prefetch_factor"] = config.get("prefetch_factor", 2)
+            pages = max(1, batchsize // getattr(data, "crops_per_page", 1))
+            self.loaders[key] = data_utils.DataLoader(data, batch_size=pages, shuffle=shuffle,
+                                                      collate_fn=collate_pages, **params)
+        return self.loaders[key]
+
+    def iterate(self, loader, name, epoch_number, tag="loader/first_batch_sec"):
+        """
+        Iterate over loader and report time till the first batch (workers startup) under `tag`.
+        """
+        start = time.time()
+        for batch_index, batch in enumerate(loader):
+            if batch_index == 0:
+                self.writer.add_scalars(tag, {name: time.time() - start}, epoch_number)
+            yield batch
+
     def load_criterion(self):
         return nn.BCEWithLogitsLoss()
 
     def train_epoch(self, epoch_number):
         config = self.config["train"]
-        it = data_utils.DataLoader(self.train_data, batch_size=config["batch"], num_workers=8, shuffle=True)
-        it = tqdm(it, desc="train[%d]" % epoch_number)
+        loader = self.get_loader("train", self.train_data, config["batch"], shuffle=True)
+        it = tqdm(self.iterate(loader, "train", epoch_number), desc="train[%d]" % epoch_number, total=len(loader))
         self.model.train()
 
         collection = Collector()
-        for batch_index, (img, mask, class_mask) in enumerate(it):
-            img, mask = img.to(self.device), mask.to(self.device)
+        for batch_index, (img, mask, class_mask, true_rects, true_classes, true_counts) in enumerate(it):
+            true_boxes = true_rects, true_classes, true_counts
+            img, mask = img.to(self.device, non_blocking=True), mask.to(self.device, non_blocking=True)
 
             self.optim.zero_grad()
             out = self.model(img)
@@ -137,7 +196,7 @@ class Trainer(object):
             # loss.backward()
 
             out_mask = out.detach().sigmoid() > 0.5
-            proj, rectangles, proj_class, image_index, true_pred_map = process_batch_torch_wrap(img.detach().cpu(), out_mask.cpu(), class_mask, filter_masks=True)
+            _, rectangles, proj_class, image_index, true_pred_map = process_batch_torch_wrap(img.detach().cpu(), out_mask.cpu(), class_mask, filter_masks=True, pool=self.pool, outputs=self.POSTPROCESS_OUTPUTS, true_boxes=true_boxes)
             sizes = [[w, h] for _, _, w, h in rectangles]
             if len(sizes):
                 self.writer.add_scalars("batch/mean", dict(W=np.mean(sizes, 0)[0],
@@ -145,12 +204,12 @@ class Trainer(object):
 
             total_loss = loss
             proj_loss = torch.zeros(1)
-            if proj.shape[0] == 0:
+            if len(rectangles) == 0:
                 not_enough_rects = True
             else:
                 not_enough_rects = False
-                proj, proj_class = proj.to(self.device), proj_class.to(self.device)
-                self.writer.add_scalars("batch/proj_B_size", dict(train=proj.size(0)), self.global_step)
+                proj_class = proj_class.to(self.device)
+                self.writer.add_scalars("batch/proj_B_size", dict(train=len(rectangles)), self.global_step)
                 # TODO: Squeeze Patch
                 proj_out = self.proj_model(process_patches(img, rectangles, image_index).to(self.device))
 
@@ -195,7 +254,7 @@ class Trainer(object):
                     VOC_metrics = mAP_wrapper(rectangles,
                                               pred_classes=proj_out,
                                               image_indeces=image_index,
-                                              label_mask=class_mask)
+                                              label_mask=class_mask, true_boxes=true_boxes)
                     AP = np.mean([row["AP"] for row in VOC_metrics])
                     metric_slug = "VOC_Metrics_AP"
                     collection.add(metric_slug, AP)
@@ -223,28 +282,29 @@ class Trainer(object):
 
     def val_epoch(self, epoch_number, name="val", data=None):
         config = self.config[name]
-        it = data_utils.DataLoader(data, batch_size=config["batch"], num_workers=8, shuffle=False)
-        it = tqdm(it, desc="%s[%d]" % (name, epoch_number))
+        loader = self.get_loader(name, data, config["batch"])
+        it = tqdm(self.iterate(loader, name, epoch_number), desc="%s[%d]" % (name, epoch_number), total=len(loader))
         self.model.eval()
 
         collection = Collector()
-        for batch_index, (img, mask, class_mask) in enumerate(it):
-            img, mask = img.to(self.device), mask.to(self.device)
+        for batch_index, (img, mask, class_mask, true_rects, true_classes, true_counts) in enumerate(it):
+            true_boxes = true_rects, true_classes, true_counts
+            img, mask = img.to(self.device, non_blocking=True), mask.to(self.device, non_blocking=True)
 
             with torch.no_grad():
                 out = self.model(img)
                 loss = self.criterion(out, mask)
 
                 out_mask = out.detach().sigmoid() > 0.5
-                proj, rectangles, proj_class, image_index, true_pred_map = process_batch_torch_wrap(img.detach().cpu(), out_mask.cpu(), class_mask, filter_masks=False)
+                _, rectangles, proj_class, image_index, true_pred_map = process_batch_torch_wrap(img.detach().cpu(), out_mask.cpu(), class_mask, filter_masks=False, pool=self.pool, outputs=self.POSTPROCESS_OUTPUTS, true_boxes=true_boxes)
 
                 total_loss = loss
                 proj_loss = torch.zeros(1)
-                if proj.shape[0] == 0:
+                if len(rectangles) == 0:
                     not_enough_rects = True
                 else:
                     not_enough_rects = False
-                    proj, proj_class = proj.to(self.device), proj_class.to(self.device)
+                    proj_class = proj_class.to(self.device)
                     patches = process_patches(img, rectangles, image_index).to(self.device)
                     if patches.shape[0]:
                         proj_out = []
@@ -285,7 +345,7 @@ class Trainer(object):
                     VOC_metrics = mAP_wrapper(rectangles,
                                       pred_classes=proj_out,
                                       image_indeces=image_index,
-                                      label_mask=class_mask)
+                                      label_mask=class_mask, true_boxes=true_boxes)
                     AP = np.mean([row["AP"] for row in VOC_metrics])
                     metric_slug = "VOC_Metrics_AP"
                     collection.add(metric_slug, AP)
@@ -304,30 +364,32 @@ class Trainer(object):
         return epoch_loss, epoch_reduced_metrics
 
     def calc_metrics(self, epoch_number, name="val", data=None, batchsize=4):
-        it = data_utils.DataLoader(data, batch_size=batchsize, num_workers=8, shuffle=False)
-        it = tqdm(it, desc="%s[%d]" % (name, epoch_number))
+        loader = self.get_loader(name, data, batchsize)
+        it = tqdm(self.iterate(loader, name, epoch_number, tag="loader/metrics_first_batch_sec"),
+                  desc="%s[%d]" % (name, epoch_number), total=len(loader))
         self.model.eval()
 
         collection = Collector()
-        boxes = BoundingBoxes()
+        accumulator = APAccumulator()
         iou = []
-        for batch_index, (img, mask, class_mask) in enumerate(it):
-            img, mask = img.to(self.device), mask.to(self.device)
+        for batch_index, (img, mask, class_mask, true_rects, true_classes, true_counts) in enumerate(it):
+            true_boxes = true_rects, true_classes, true_counts
+            img, mask = img.to(self.device, non_blocking=True), mask.to(self.device, non_blocking=True)
 
             with torch.no_grad():
                 out = self.model(img)
                 loss = self.criterion(out, mask)
 
                 out_mask = out.detach().sigmoid() > 0.5
-                proj, rectangles, proj_class, image_index, true_pred_map = process_batch_torch_wrap(img.detach().cpu(), out_mask.cpu(), class_mask, filter_masks=False)
+                _, rectangles, proj_class, image_index, true_pred_map = process_batch_torch_wrap(img.detach().cpu(), out_mask.cpu(), class_mask, filter_masks=False, pool=self.pool, outputs=self.POSTPROCESS_OUTPUTS, true_boxes=true_boxes)
 
                 total_loss = loss
                 proj_loss = torch.zeros(1)
-                if proj.shape[0] == 0:
+                if len(rectangles) == 0:
                     not_enough_rects = True
                 else:
                     not_enough_rects = False
-                    proj, proj_class = proj.to(self.device), proj_class.to(self.device)
+                    proj_class = proj_class.to(self.device)
                     patches = process_patches(img, rectangles, image_index).to(self.device)
                     if patches.shape[0]:
                         proj_out = []
@@ -362,12 +424,11 @@ class Trainer(object):
                 batch_metrics[metric_slug] = metric_value
 
                 if not_enough_rects is False:
-                    VOC_boxes = maP_create_boxes(rectangles,
-                                      pred_classes=proj_out,
-                                      image_indeces=image_index,
-                                      label_mask=class_mask, relative_index=len(boxes))
-                    for box in VOC_boxes:
-                        boxes.addBoundingBox(box)
+                    accumulator.add(maP_create_boxes(rectangles,
+                                                     pred_classes=proj_out,
+                                                     image_indeces=image_index,
+                                                     label_mask=class_mask,
+                                                     true_boxes=true_boxes))
 
             it.set_postfix(loss=loss.item(), **batch_metrics)
 
@@ -376,7 +437,7 @@ class Trainer(object):
             elif batch_index == 0:
                 self._write_images(name, img, out.sigmoid(), epoch_number)
 
-        VOC_metrics = mAP_wrapper_from_boxes(boxes)
+        VOC_metrics = accumulator.result()
         print("AP", [row["AP"] for row in VOC_metrics])
         AP = np.mean([row["AP"] for row in VOC_metrics])
         IOU = np.mean(iou)
@@ -451,6 +512,14 @@ class Trainer(object):
             img = torch.from_numpy(img.transpose(2, 0, 1) / 255.0)
             self.writer.add_image("{}/image-{}".format(general_tag, image_index + 1), img, epoch)
 
+    def close(self):
+        """
+        Shut down the post-processing pool, otherwise process pools fail at interpreter exit.
+        """
+        if self.pool is not None:
+            self.pool.shutdown()
+            self.pool = None
+
     def train(self):
         self.global_step = 0
         self.val_global_step = 0
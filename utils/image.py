@@ -1,7 +1,6 @@
 import cv2
 import numpy as np
 import copy
-import tensorflow as tf
 from . import tfrecords
 import os
 
@@ -16,15 +15,65 @@ def _transform_regions(regions, transform=lambda x: x):
     return new_regions
 
 
+REDUCED_READ_FLAGS = {
+    (False, 1): cv2.IMREAD_COLOR,
+    (False, 2): cv2.IMREAD_REDUCED_COLOR_2,
+    (False, 4): cv2.IMREAD_REDUCED_COLOR_4,
+    (False, 8): cv2.IMREAD_REDUCED_COLOR_8,
+    (True, 1): cv2.IMREAD_GRAYSCALE,
+    (True, 2): cv2.IMREAD_REDUCED_GRAYSCALE_2,
+    (True, 4): cv2.IMREAD_REDUCED_GRAYSCALE_4,
+    (True, 8): cv2.IMREAD_REDUCED_GRAYSCALE_8,
+}
+
+
+def find_reduction(size, min_size):
+    """
+    Find biggest power-of-two reduction which keeps image not smaller than `min_size`.
+    :param size: (width, height) of original image
+    :param min_size: (width, height) wanted at least
+    :return: reduction - 1, 2, 4 or 8
+    """
+    reduction = 1
+    while reduction < 8 and size[0] // (reduction * 2) >= min_size[0] \
+            and size[1] // (reduction * 2) >= min_size[1]:
+        reduction *= 2
+    return reduction
+
+
+def read_image(image_path, size=None, grayscale=False, min_size=None):
+    """
+    Decode image, optionally straight to grayscale and at reduced scale.
+    :param image_path: path to image
+    :param size: (width, height) of image if known, required for reduced decode
+    :param grayscale: decode image straight to grayscale
+    :param min_size: (width, height) - if set, image is decoded at reduced
+    power-of-two scale which is not smaller than `min_size`
+    :return: Image without regions
+    """
+    reduction = 1
+    if min_size is not None and size is not None:
+        reduction = find_reduction(size, min_size)
+    image = cv2.imread(image_path, REDUCED_READ_FLAGS[grayscale, reduction])
+    return Image(image, filename=os.path.basename(image_path), reduction=reduction)
+
+
 class Image:
-    def __init__(self, image, filename="image.jpg"):
+    def __init__(self, image, filename="image.jpg", reduction=1):
+        """
+        :param image: np.array - decoded image
+        :param filename: image filename
+        :param reduction: int - how many times image was downscaled on decode,
+        regions contours stay in coordinates of original image
+        """
         self.image = image
         self.filename = filename
+        self.reduction = reduction
         self.regions = []
 
     def scale(self, size):
         new_image = Image(cv2.resize(self.image, size))
-        scale = size[0] / self.width,  size[1] / self.height
+        scale = size[0] / (self.width * self.reduction),  size[1] / (self.height * self.reduction)
         f = lambda x: np.array(x * scale, int)
         new_image.regions = list(map(lambda x: x.transform(f), self.regions))
         return new_image
@@ -34,7 +83,7 @@ class Image:
             x, y, w, h = cv2.boundingRect(x)
             return np.array([(x, y), (x + w, y), (x + w, y + h), (x, y + h)], int)
 
-        new_image = Image(self.image.copy(), self.filename)
+        new_image = Image(self.image.copy(), self.filename, self.reduction)
         new_image.regions = list(map(lambda x: x.transform(f), self.regions))
         return new_image
 
@@ -110,7 +159,7 @@ class Image:
         encoded_jpg = cv2.imencode('.jpg', self.image)[1].tostring()
         image_format = b'jpg'
         xmins, xmaxs, ymins, ymaxs, classes_text, classes = self.__create_labels(level)
-        tf_example = tf.train.Example(features=tf.train.Features(feature={
+        return tfrecords.example({
             'image/height': tfrecords.int64_feature(self.height),
             'image/width': tfrecords.int64_feature(self.width),
             'image/filename': tfrecords.bytes_feature(filename),
@@ -123,8 +172,7 @@ class Image:
             'image/object/bbox/ymax': tfrecords.float_list_feature(ymaxs),
             'image/object/class/text': tfrecords.bytes_list_feature(classes_text),
             'image/object/class/label': tfrecords.int64_list_feature(classes),
-        }))
-        return tf_example.SerializeToString()
+        })
 
 
     def draw_regions(self, level=Region.LEVEL_CATEGORY):
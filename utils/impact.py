@@ -1,72 +1,97 @@
 import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
 from pathlib import Path
-from xml.dom.minidom import parse
-import cv2
+from xml.etree.ElementTree import iterparse
 import numpy as np
-from .image import Image, Region
-import tensorflow as tf
-from tqdm import tqdm
+from .image import Region, read_image
 
 from utils.region import generate_label_map
+from utils.tfrecords import write_sharded
 
 
-def find_regions(dom, tag_class):
-    regions = []
-    region_tags = dom.getElementsByTagName(tag_class.capitalize() + "Region")
+REGION_CLASSES = (Region.TEXT, Region.IMAGE, Region.SEPARATOR, Region.GRAPHIC)
 
-    for region_tag in region_tags:
-        if region_tag.hasAttribute("type"):
-            region_type = region_tag.getAttribute("type")
-        else:
-            region_type = tag_class
 
-        point_tags = region_tag.getElementsByTagName("Point")
-        countour = []
-        for point_tag in point_tags:
-            countour.append((point_tag.getAttribute("x"), point_tag.getAttribute("y")))
-        regions.append(Region(tag_class, region_type, np.array(countour, int)))
-    return regions
+def read_xml(file):
+    """
+    Read PAGE annotation without decoding the image, in a single streaming pass.
+    Each region collects all Point elements inside it, regions are grouped by class
+    in order of `REGION_CLASSES` and keep document order within a class.
+    Regions with types unknown to `Region`, e.g. "drop-capital" or "marginalia", are skipped.
+    :param file: path to PAGE xml
+    :return: image_path, (width, height) or None, regions
+    """
+    file = Path(file)
+    # tag: (class, regions of the class as [type, points])
+    classes = {tag_class.capitalize() + "Region": (tag_class, []) for tag_class in REGION_CLASSES}
+    page = None
+    open_regions = []
+    for event, element in iterparse(str(file), events=("start", "end")):
+        # PAGE elements are namespaced, "{namespace}TextRegion"
+        tag = element.tag.rpartition("}")[2]
+        if event == "end":
+            if tag in classes:
+                open_regions.pop()
+            element.clear()
+        elif tag == "Point":
+            point = element.get("x", ""), element.get("y", "")
+            for region in open_regions:
+                region[1].append(point)
+        elif tag in classes:
+            tag_class, regions = classes[tag]
+            region = [element.get("type", tag_class), []]
+            regions.append(region)
+            open_regions.append(region)
+        elif tag == "Page" and page is None:
+            page = dict(element.attrib)
 
+    image_path = str(file.parent / page.get("imageFilename", ""))
+    size = None
+    if "imageWidth" in page and "imageHeight" in page:
+        size = int(page["imageWidth"]), int(page["imageHeight"])
+    regions = [Region(tag_class, region_type, np.array(countour, int))
+               for tag_class, class_regions in classes.values()
+               for region_type, countour in class_regions
+               if region_type in Region.SUBCATEGORIES[tag_class]]
+    return image_path, size, regions
 
-def parse_xml(file):
-    file = Path(file)
-    dom = parse(str(file))
-    image_filename = dom.getElementsByTagName("Page")[0].getAttribute('imageFilename')
-    image_path = str(file.parent / image_filename)
-    image = cv2.imread(image_path)
 
-    image_object = Image(image, filename=image_filename)
-    image_object.regions += find_regions(dom, Region.TEXT)
-    image_object.regions += find_regions(dom, Region.IMAGE)
-    image_object.regions += find_regions(dom, Region.SEPARATOR)
-    image_object.regions += find_regions(dom, Region.GRAPHIC)
-    return image_object
+def read_directory(in_path, workers=None):
+    """
+    Read all PAGE annotations of the folder in a process pool, see `read_xml`.
+    :param in_path: folder with PAGE xml files
+    :param workers: number of processes, None for the number of CPUs, 0 to read in this process
+    :return: files - sorted list of paths, annotations - list of read_xml results
+    """
+    files = [str(Path(in_path) / file) for file in sorted(os.listdir(in_path)) if file.endswith(".xml")]
+    if workers == 0:
+        return files, list(map(read_xml, files))
+    with ProcessPoolExecutor(workers) as executor:
+        return files, list(executor.map(read_xml, files, chunksize=16))
 
 
-def to_tfrecords(in_path, out_path, level=Region.LEVEL_CATEGORY):
-    files = list(filter(lambda x: x.endswith(".xml"), os.listdir(in_path)))
-    path = Path(in_path)
-    generate_label_map(out_path, level=level)
-    writer = tf.python_io.TFRecordWriter(os.path.join(out_path, "src.record"))
-    for file in tqdm(files):
-        file = path / file
-        image_object = parse_xml(file)
-        image_object = image_object.correct()
-        writer.write(image_object.to_tfrecord(level=level))
-    writer.close()
+def parse_xml(file, grayscale=False, min_size=None):
+    image_path, size, regions = read_xml(file)
+    image_object = read_image(image_path, size, grayscale=grayscale, min_size=min_size)
+    image_object.regions = regions
+    return image_object
+
 
+def _page_record(file, level):
+    image_object = parse_xml(file)
+    image_object = image_object.correct()
+    return image_object.to_tfrecord(level=level)
 
-if __name__ == "__main__":
-    # images = to_tfrecords("../src/impact", "../out/", level=Region.LEVEL_SUBCATEGORY)
-    # ../data/impact/pc-00539981.xml
-    # for file in os.listdir("../data/impact"):
-    # if file.endswith(".xml"):
-    image = parse_xml("../data/impact/pc-00539980.xml")
-    #     cv2.imwrite(os.path.join("../out/data", image.filename + ""), image.draw_regions())
 
-    # image = cv2.imread("../data/supervisely/zbirnyk/tom_1/1108-2162-1-PB/img/img_0.jpg")
-    # image = Image(image)
-    # image = image.correct()
-    # print(image.image)
-    cv2.imwrite("../out/out.jpg", image.draw_regions(level=Region.LEVEL_SUBCATEGORY))
-    # print(info)
+def to_tfrecords(in_path, out_path, level=Region.LEVEL_CATEGORY, shards=1, workers=None, ordered=True):
+    """
+    Export pages to TFRecords, see `utils.tfrecords.write_sharded` for `shards`, `workers` and `ordered`.
+    :return: list of written files
+    """
+    files = sorted(filter(lambda x: x.endswith(".xml"), os.listdir(in_path)))
+    path = Path(in_path)
+    files = [path / file for file in files]
+    generate_label_map(out_path, level=level)
+    return write_sharded(partial(_page_record, level=level), files, os.path.join(out_path, "src.record"),
+                         shards=shards, workers=workers, ordered=ordered)
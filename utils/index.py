@@ -0,0 +1,370 @@
+import argparse
+import os
+
+import numpy as np
+from tqdm import tqdm
+
+from utils import impact, labelImg, supervisely
+from utils.image import read_image
+from utils.region import Region
+
+SUPERVISELY = "supervisely"
+IMPACT = "impact"
+LABELIMG = "labelImg"
+
+SUBCATEGORIES = [(category, subcategory)
+                 for category in Region.CATEGORIES
+                 for subcategory in Region.SUBCATEGORIES[category]]
+
+
+class AnnotationReader(object):
+    """
+    Annotation source: lists annotation files of a folder and reads them without decoding images.
+    New sources are added with `register_reader`.
+    """
+    def list(self, path):
+        """
+        :param path: source folder
+        :return: list of annotation files
+        """
+        raise NotImplementedError
+
+    def read(self, file):
+        """
+        :param file: annotation file
+        :return: image_path, (width, height) or None, regions
+        """
+        raise NotImplementedError
+
+    def parse(self, file, grayscale=False, min_size=None):
+        """
+        Read annotation and decode its image, see `utils.image.read_image`.
+        :return: utils.image.Image
+        """
+        image_path, size, regions = self.read(file)
+        image_object = read_image(image_path, size, grayscale=grayscale, min_size=min_size)
+        image_object.regions = regions
+        return image_object
+
+
+class SuperviselyReader(AnnotationReader):
+    def list(self, path):
+        path = os.path.join(path, supervisely.ANNOTATION_FOLDER)
+        return [os.path.join(path, fn) for fn in os.listdir(path)]
+
+    def read(self, file):
+        return supervisely.read_json(file)
+
+
+class ImpactReader(AnnotationReader):
+    def list(self, path):
+        return [os.path.join(path, fn) for fn in os.listdir(path) if fn.endswith(".xml")]
+
+    def read(self, file):
+        return impact.read_xml(file)
+
+
+class LabelImgReader(AnnotationReader):
+    def list(self, path):
+        return [os.path.join(path, fn) for fn in os.listdir(path) if fn.endswith(".xml")]
+
+    def read(self, file):
+        return labelImg.read_xml(file)
+
+
+READERS = {SUPERVISELY: SuperviselyReader(), IMPACT: ImpactReader(), LABELIMG: LabelImgReader()}
+
+
+def register_reader(source, reader):
+    """
+    :param source: name of the source as used in `data.list` and the index
+    :param reader: AnnotationReader
+    """
+    READERS[source] = reader
+
+
+def get_reader(source):
+    if source not in READERS:
+        raise ValueError("Unknown annotation source: {}".format(source))
+    return READERS[source]
+
+
+def list_annotations(source, path):
+    """
+    List annotation files of the source folder.
+    :param source: SUPERVISELY, IMPACT, LABELIMG or registered source
+    :param path: source folder
+    :return: list of annotation files
+    """
+    return get_reader(source).list(path)
+
+
+def read_annotation(source, file):
+    """
+    :return: image_path, (width, height) or None, regions
+    """
+    return get_reader(source).read(file)
+
+
+def parse_annotation(source, file, grayscale=False, min_size=None):
+    """
+    :return: utils.image.Image with regions
+    """
+    return get_reader(source).parse(file, grayscale=grayscale, min_size=min_size)
+
+
+def parse_sources(entries):
+    """
+    Sources of YAML `data.list`, each entry is a Supervisely folder or a mapping {path, format}, e.g.
+    {"path": "_data/impact", "format": "impact"}.
+    :return: list of (source, path)
+    """
+    sources = []
+    for entry in entries:
+        if isinstance(entry, dict):
+            sources.append((entry.get("format", SUPERVISELY), entry["path"]))
+        else:
+            sources.append((SUPERVISELY, entry))
+    return sources
+
+
+def source_entry(arg):
+    """
+    Command line source as `data.list` entry, "SOURCE:PATH" or a Supervisely folder, see `parse_sources`.
+    """
+    source, separator, path = arg.partition(":")
+    if separator and source in READERS:
+        return {"path": path, "format": source}
+    return arg
+
+
+REGION_FIELDS = ("category_id", "subcategory_id", "x", "y", "w", "h")
+
+
+def read_page(source, file):
+    """
+    Read one annotation into index rows.
+    :return: page - dict of page columns, regions - dict of np.array of region columns,
+             contours - list of np.int32(K, 2)
+    """
+    mtime = os.path.getmtime(file)
+    image_path, size, page_regions = read_annotation(source, file)
+    if size is None:
+        image = read_image(image_path)
+        size = image.width, image.height
+    page = {"source": source, "annotation": file, "image": image_path, "width": size[0], "height": size[1],
+            "mtime": mtime}
+    regions = {name: [] for name in REGION_FIELDS}
+    contours = []
+    for region in page_regions:
+        mn = np.min(region.contour, axis=0)
+        mx = np.max(region.contour, axis=0)
+        regions["category_id"].append(region.category_id)
+        regions["subcategory_id"].append(region.subcategory_id)
+        regions["x"].append(mn[0])
+        regions["y"].append(mn[1])
+        regions["w"].append(mx[0] - mn[0])
+        regions["h"].append(mx[1] - mn[1])
+        contours.append(np.asarray(region.contour, dtype=np.int32).reshape(-1, 2))
+    return page, {name: np.array(values, dtype=np.int64) for name, values in regions.items()}, contours
+
+
+def _assemble(sources, entries):
+    # AnnotationIndex from `read_page` results in page order
+    columns = {
+        "source": np.array([page["source"] for page, _, _ in entries], dtype=str),
+        "annotation": np.array([page["annotation"] for page, _, _ in entries], dtype=str),
+        "image": np.array([page["image"] for page, _, _ in entries], dtype=str),
+        "width": np.array([page["width"] for page, _, _ in entries], dtype=np.int32),
+        "height": np.array([page["height"] for page, _, _ in entries], dtype=np.int32),
+        "mtime": np.array([page["mtime"] for page, _, _ in entries], dtype=np.float64),
+        "page": np.repeat(np.arange(len(entries), dtype=np.int32),
+                          [len(regions["x"]) for _, regions, _ in entries]).astype(np.int32),
+    }
+    dtypes = {"category_id": np.int8, "subcategory_id": np.int16}
+    for name in REGION_FIELDS:
+        values = [regions[name] for _, regions, _ in entries]
+        columns[name] = np.concatenate(values).astype(dtypes.get(name, np.int32)) if values \
+            else np.zeros(0, dtypes.get(name, np.int32))
+    contours = [contour for _, _, page_contours in entries for contour in page_contours]
+    columns["sources"] = np.array(["{}:{}".format(source, path) for source, path in sources], dtype=str)
+    columns["contour_offsets"] = np.cumsum([0] + [len(contour) for contour in contours]).astype(np.int64)
+    columns["contour_points"] = np.concatenate(contours) if contours else np.zeros((0, 2), np.int32)
+    return AnnotationIndex(columns)
+
+
+def build_index(sources):
+    """
+    Scan annotation sources once into columnar AnnotationIndex.
+    :param sources: list of (source, path), e.g. [("supervisely", "_data/supervisely/zbirnyk/tom_1/1108-2162-1-PB")]
+    :return: AnnotationIndex
+    """
+    # a folder listed twice, e.g. in both train and test lists, is indexed once
+    sources = list(dict.fromkeys((source, path) for source, path in sources))
+    entries = []
+    for source, path in sources:
+        for file in tqdm(list_annotations(source, path), desc=os.path.basename(path)):
+            entries.append(read_page(source, file))
+    return _assemble(sources, entries)
+
+
+class AnnotationIndex(object):
+    """
+    Columnar table of all pages and regions of annotation sources.
+    Page columns: source, annotation, image, width, height, mtime of annotation.
+    Region columns: page, category_id, subcategory_id, x, y, w, h,
+    contour of region i is contour_points[contour_offsets[i]:contour_offsets[i + 1]].
+    Regions are sorted by page. Indexed sources are kept as "source:path" in sources.
+    """
+    PAGE_COLUMNS = ("source", "annotation", "image", "width", "height", "mtime")
+    REGION_COLUMNS = ("page", "category_id", "subcategory_id", "x", "y", "w", "h")
+
+    def __init__(self, columns):
+        self.columns = columns
+        self.region_offsets = np.searchsorted(columns["page"], np.arange(len(self) + 1))
+        self._pages = None
+
+    @staticmethod
+    def load(path):
+        with np.load(path) as data:
+            return AnnotationIndex({name: data[name] for name in data.files})
+
+    def save(self, path):
+        with open(path, "wb") as f:
+            np.savez(f, **self.columns)
+
+    def __len__(self):
+        return len(self.columns["annotation"])
+
+    def __getitem__(self, name):
+        return self.columns[name]
+
+    def page(self, annotation):
+        """
+        :param annotation: path to annotation file as it was indexed
+        :return: page id
+        """
+        return self._page_ids()[annotation]
+
+    def _page_ids(self):
+        if self._pages is None:
+            self._pages = {file: page for page, file in enumerate(self.columns["annotation"].tolist())}
+        return self._pages
+
+    def pages_in(self, path):
+        """
+        :param path: source folder
+        :return: np.array of page ids of annotations inside `path`
+        """
+        prefix = os.path.join(path, "")
+        return np.flatnonzero(np.char.startswith(self.columns["annotation"], prefix))
+
+    def region_slice(self, page):
+        return slice(self.region_offsets[page], self.region_offsets[page + 1])
+
+    def page_entry(self, page):
+        """
+        :param page: page id
+        :return: rows of the page in the format of `read_page`
+        """
+        entry = {name: self.columns[name][page].item() for name in self.PAGE_COLUMNS}
+        regions = self.region_slice(page)
+        offsets = self.columns["contour_offsets"]
+        points = self.columns["contour_points"]
+        contours = [points[offsets[i]:offsets[i + 1]] for i in range(regions.start, regions.stop)]
+        return entry, {name: self.columns[name][regions] for name in REGION_FIELDS}, contours
+
+    @property
+    def sources(self):
+        return [tuple(source.split(":", 1)) for source in self.columns["sources"]]
+
+    def refresh(self):
+        """
+        Re-read annotations changed since indexing, as `unet.cache.PageCache` checks mtime,
+        add new and drop removed annotations of the indexed sources.
+        :return: updated AnnotationIndex, or self when nothing changed
+        """
+        mtimes = self.columns["mtime"]
+        entries = []
+        changed = False
+        for source, path in self.sources:
+            for file in list_annotations(source, path):
+                page = self._page_ids().get(file)
+                if page is not None and mtimes[page] == os.path.getmtime(file):
+                    entries.append(self.page_entry(page))
+                else:
+                    entries.append(read_page(source, file))
+                    changed = True
+        if not changed and len(entries) == len(self):
+            return self
+        return _assemble(self.sources, entries)
+
+    def regions(self, page):
+        """
+        :param page: page id
+        :return: list of utils.region.Region
+        """
+        offsets = self.columns["contour_offsets"]
+        points = self.columns["contour_points"]
+        regions = []
+        for i in range(self.region_offsets[page], self.region_offsets[page + 1]):
+            category, subcategory = SUBCATEGORIES[self.columns["subcategory_id"][i] - 1]
+            contour = points[offsets[i]:offsets[i + 1]].astype(int)
+            regions.append(Region(category, subcategory, contour))
+        return regions
+
+    def parse(self, annotation, grayscale=False, min_size=None):
+        """
+        Same as `supervisely.parse_json`, but regions are taken from the index.
+        :param annotation: path to annotation file as it was indexed
+        :return: utils.image.Image
+        """
+        page = self.page(annotation)
+        size = self.columns["width"][page], self.columns["height"][page]
+        image_object = read_image(str(self.columns["image"][page]), size, grayscale=grayscale, min_size=min_size)
+        image_object.regions = self.regions(page)
+        return image_object
+
+    def category_counts(self, pages=None):
+        """
+        :param pages: page ids, all pages by default
+        :return: np.array - amount of regions of every category id
+        """
+        category_id = self.columns["category_id"]
+        if pages is not None:
+            category_id = category_id[np.isin(self.columns["page"], pages)]
+        return np.bincount(category_id, minlength=len(Region.CATEGORIES) + 1)
+
+
+def open_index(path, sources):
+    """
+    Load index from `path` or build it from `sources` and save.
+    Index is rebuilt when it misses any of `sources`, changed annotations are re-read, see `refresh`.
+    """
+    sources = list(sources)
+    if os.path.exists(path):
+        index = AnnotationIndex.load(path)
+        indexed = set(index.columns.get("sources", []))
+        # indexes saved without mtime can not be checked and are rebuilt
+        if "mtime" in index.columns and all("{}:{}".format(source, in_path) in indexed
+                                            for source, in_path in sources):
+            refreshed = index.refresh()
+            if refreshed is not index:
+                refreshed.save(path)
+            return refreshed
+    index = build_index(sources)
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    index.save(path)
+    return index
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build annotation index")
+    parser.add_argument("out", help="output .npz file")
+    parser.add_argument("sources", nargs="+", help="SOURCE:PATH, source is one of {}".format(
+        ", ".join((SUPERVISELY, IMPACT, LABELIMG))))
+    args = parser.parse_args()
+    index = build_index([source.split(":", 1) for source in args.sources])
+    index.save(args.out)
+    print("Pages", len(index))
+    print("Regions", dict(zip(["none"] + Region.CATEGORIES, index.category_counts().tolist())))
@@ -0,0 +1,58 @@
+import cv2
+import numpy as np
+
+
+def integral_image(image):
+    """
+    Summed-area table of the page, built once and shared by all regions.
+    :param image: np.array(H, W)
+    :return: np.array(H + 1, W + 1) of float64, integral[y, x] = image[:y, :x].sum()
+    """
+    return cv2.integral(np.ascontiguousarray(image, dtype=np.float64), sdepth=cv2.CV_64F)
+
+
+def _cumulative(integral, band_start, band_stop, edges, axis):
+    """
+    Sum of the band between `band_start` and `band_stop` up to every fractional edge.
+    Mass of a pixel is spread uniformly over it, so cumulative sum is linear between pixel borders.
+    """
+    last = integral.shape[1 - axis] - 2
+    start = np.clip(np.floor(edges).astype(np.int64), 0, last)
+    t = edges - start
+    if axis == 0:
+        # x edges, band of rows
+        low = integral[band_stop[:, None], start] - integral[band_start[:, None], start]
+        high = integral[band_stop[:, None], start + 1] - integral[band_start[:, None], start + 1]
+    else:
+        # y edges, band of columns
+        low = integral[start, band_stop[:, None]] - integral[start, band_start[:, None]]
+        high = integral[start + 1, band_stop[:, None]] - integral[start + 1, band_start[:, None]]
+    return low + t * (high - low)
+
+
+def projection_profiles(integral, rectangles, bins=100):
+    """
+    Resampled x and y projection profiles of every rectangle in one vectorized call.
+    Bin j of x profile is the mass of the j-th of `bins` equal vertical strips of the rectangle,
+    normalized as the sum over `bins` rows of the region resized to (bins, bins) by area averaging.
+    :param integral: result of `integral_image`
+    :param rectangles: np.array(N, 4) of (x, y, w, h)
+    :param bins: length of profiles
+    :return: x_projections - np.array(N, bins), y_projections - np.array(N, bins)
+    """
+    rectangles = np.asarray(rectangles, dtype=np.int64).reshape(-1, 4)
+    x, y, w, h = rectangles.T
+    # clip to the page like array slicing does
+    height, width = integral.shape[0] - 1, integral.shape[1] - 1
+    x, x_stop = np.clip(x, 0, width), np.clip(x + w, 0, width)
+    y, y_stop = np.clip(y, 0, height), np.clip(y + h, 0, height)
+    w, h = x_stop - x, y_stop - y
+    steps = np.linspace(0, 1, bins + 1)
+    x_edges = x[:, None] + w[:, None] * steps
+    y_edges = y[:, None] + h[:, None] * steps
+
+    x_cumulative = _cumulative(integral, y, y_stop, x_edges, axis=0)
+    y_cumulative = _cumulative(integral, x, x_stop, y_edges, axis=1)
+    # mean of a strip times `bins` pixels of the resized region
+    scale = bins * bins / np.maximum(w * h, 1)[:, None]
+    return np.diff(x_cumulative, axis=1) * scale, np.diff(y_cumulative, axis=1) * scale
@@ -4,10 +4,58 @@ from pathlib import Path
 import cv2
 #import tensorflow as tf
 from tqdm import tqdm
-from image import Image
 from xml.dom.minidom import parse
+import numpy as np
 import pandas as pd
 
+from utils.region import Region
+
+
+def find_category(name):
+    """
+    Map labelImg label to (category, subcategory).
+    :param name: label, e.g. "text/paragraph", "paragraph" or "separator"
+    :return: (category, subcategory) or None if label is unknown
+    """
+    if "/" in name:
+        category, subcategory = name.split("/", 1)
+        if subcategory in Region.SUBCATEGORIES.get(category, []):
+            return category, subcategory
+        return None
+    for category in Region.CATEGORIES:
+        if name in Region.SUBCATEGORIES[category]:
+            return category, name
+    return None
+
+
+def _text(node, tag):
+    return node.getElementsByTagName(tag).item(0).firstChild.nodeValue
+
+
+def read_xml(file):
+    """
+    Read labelImg (Pascal VOC) annotation without decoding the image.
+    Objects with labels unknown to `find_category` are skipped.
+    :param file: path to xml
+    :return: image_path, (width, height), regions
+    """
+    dom = parse(file)
+    image_path = os.path.join(os.path.dirname(file), _text(dom, "filename"))
+    size_tag = dom.getElementsByTagName("size").item(0)
+    size = int(_text(size_tag, "width")), int(_text(size_tag, "height"))
+
+    regions = []
+    for region in dom.getElementsByTagName("object"):
+        category = find_category(_text(region, "name"))
+        if category is None:
+            continue
+        bndbox = region.getElementsByTagName("bndbox").item(0)
+        contour = [(float(_text(bndbox, "xmin")), float(_text(bndbox, "ymin"))),
+                   (float(_text(bndbox, "xmax")), float(_text(bndbox, "ymax")))]
+        regions.append(Region(category[0], category[1], np.array(contour, int)))
+    return image_path, size, regions
+
+
 def statistic(inpath):
     info = {}
     for path in os.listdir(inpath):
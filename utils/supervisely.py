@@ -2,14 +2,16 @@ import json
 import os
 import pickle
 import shutil
+from functools import partial
 
 import cv2
 import numpy as np
-import tensorflow as tf
 from tqdm import tqdm
 
-from utils.image import Image
+from utils.image import Image, read_image
+from utils.integral import integral_image, projection_profiles
 from utils.region import Region, get_spaced_colors, generate_label_map
+from utils.tfrecords import write_sharded
 
 ANNOTATION_FOLDER = "ann"
 IMAGE_FOLDER = "img"
@@ -67,32 +69,58 @@ def find_regions(info):
     return regions
 
 
-def parse_json(file):
+def read_json(file):
+    """
+    Read supervisely annotation without decoding the image.
+    :param file: path to annotation json
+    :return: image_path, (width, height) or None, regions
+    """
     _dirname = os.path.dirname(os.path.dirname(file))
     basename = os.path.basename(file)
     image_filename = os.path.splitext(basename)[0]
     image_path = os.path.join(_dirname, IMAGE_FOLDER, image_filename)
 
-    image = cv2.imread(image_path)
-    image_object = Image(image, filename=image_filename)
-
     with open(file) as f:
         info = json.load(f)
-        image_object.regions = find_regions(info)
+    size = None
+    if "size" in info:
+        size = info["size"]["width"], info["size"]["height"]
+    return image_path, size, find_regions(info)
+
+
+def parse_json(file, grayscale=False, min_size=None):
+    """
+    Parse supervisely annotation with its image.
+    :param file: path to annotation json
+    :param grayscale: decode image straight to grayscale
+    :param min_size: (width, height) - if set, image is decoded at reduced
+    power-of-two scale which is not smaller than `min_size`
+    :return: utils.image.Image
+    """
+    image_path, size, regions = read_json(file)
+    image_object = read_image(image_path, size, grayscale=grayscale, min_size=min_size)
+    image_object.regions = regions
     return image_object
 
 
-def to_tfrecords(in_path, out_path, level=Region.LEVEL_CATEGORY, filename="data.record"):
+def _page_record(file, level):
+    image_object = parse_json(file)
+    image_object = image_object.correct()
+    return image_object.to_tfrecord(level=level)
+
+
+def to_tfrecords(in_path, out_path, level=Region.LEVEL_CATEGORY, filename="data.record", shards=1, workers=None,
+                 ordered=True):
+    """
+    Export pages to TFRecords, see `utils.tfrecords.write_sharded` for `shards`, `workers` and `ordered`.
+    :return: list of written files
+    """
     os.makedirs(out_path, exist_ok=True)
-    files = os.listdir(os.path.join(in_path, ANNOTATION_FOLDER))
+    files = sorted(os.listdir(os.path.join(in_path, ANNOTATION_FOLDER)))
+    files = [os.path.join(in_path, ANNOTATION_FOLDER, file) for file in files]
     generate_label_map(out_path, level=level)
-    writer = tf.python_io.TFRecordWriter(os.path.join(out_path, filename))
-    for file in tqdm(files):
-        file = os.path.join(in_path, ANNOTATION_FOLDER, file)
-        image_object = parse_json(file)
-        image_object = image_object.correct()
-        writer.write(image_object.to_tfrecord(level=level))
-    writer.close()
+    return write_sharded(partial(_page_record, level=level), files, os.path.join(out_path, filename),
+                         shards=shards, workers=workers, ordered=ordered)
 
 
 def extract_projections(in_path, out_path, categories=("text", "maths", "separator")):
@@ -105,20 +133,22 @@ def extract_projections(in_path, out_path, categories=("text", "maths", "separat
         file = os.path.join(in_path, ANNOTATION_FOLDER, file)
         image_object = parse_json(file)
         grey = cv2.cvtColor(image_object.image, cv2.COLOR_BGR2GRAY)
-
-        for region in image_object.regions:
-            if region.category in categories:
-                mn = np.min(region.contour, axis=0)
-                mx = np.max(region.contour, axis=0)
-                block = grey[mn[1]:mx[1], mn[0]:mx[0]] / 255
-                block = cv2.resize(block, (100, 100))
-                x = block.sum(axis=0) / 100
-                y = block.sum(axis=1) / 100
-                info = {"x": np.array(x, np.float32), "y": np.array(y, np.float32)}
-                info_path = os.path.join(out_path, region.category, "info_{}.pickle".format(counters[region.category]))
-                with open(info_path, 'wb') as f:
-                    pickle.dump(info, f)
-                counters[region.category] += 1
+        integral = integral_image(grey)
+
+        regions = [region for region in image_object.regions if region.category in categories]
+        rectangles = []
+        for region in regions:
+            mn = np.min(region.contour, axis=0)
+            mx = np.max(region.contour, axis=0)
+            rectangles.append((mn[0], mn[1], mx[0] - mn[0], mx[1] - mn[1]))
+        x_projections, y_projections = projection_profiles(integral, rectangles, bins=100)
+
+        for region, x, y in zip(regions, x_projections / 255 / 100, y_projections / 255 / 100):
+            info = {"x": np.array(x, np.float32), "y": np.array(y, np.float32)}
+            info_path = os.path.join(out_path, region.category, "info_{}.pickle".format(counters[region.category]))
+            with open(info_path, 'wb') as f:
+                pickle.dump(info, f)
+            counters[region.category] += 1
 
 
 if __name__ == "__main__":
@@ -1,20 +1,324 @@
-import tensorflow as tf
+import os
+import struct
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import ExitStack
+from functools import partial
+
+import numpy as np
+from tqdm import tqdm
+
+try:
+    from crc32c import crc32c as _crc32c
+except ImportError:
+    _crc32c = None
+
+# TFRecord and tf.train.Example encoding without TensorFlow.
+# Features are kept as serialized `tf.train.Feature` messages, `example` builds the serialized
+# `tf.train.Example` with keys in sorted order, as `SerializeToString(deterministic=True)` does.
+
+_CRC32C_POLYNOMIAL = 0x82F63B78
+_CRC32C_TABLE = []
+for _byte in range(256):
+    _crc = _byte
+    for _ in range(8):
+        _crc = (_crc >> 1) ^ _CRC32C_POLYNOMIAL if _crc & 1 else _crc >> 1
+    _CRC32C_TABLE.append(_crc)
+
+_MASK_DELTA = 0xA282EAD8
+_UINT32 = 0xFFFFFFFF
+
+
+def _crc32c_update(crc, data):
+    # register update without initial and final xor, linear in (crc, data)
+    table = _CRC32C_TABLE
+    for byte in data:
+        crc = table[(crc ^ byte) & 0xFF] ^ (crc >> 8)
+    return crc
+
+
+# Without the `crc32c` package data is split into lanes of `_LANE` bytes, registers of all lanes
+# are updated at once with NumPy and then chained: register after a lane is the register before it
+# shifted through `_LANE` zero bytes, xor the register of the lane started from zero.
+_LANE = 256
+_CRC32C_TABLE_NP = np.array(_CRC32C_TABLE, dtype=np.uint32)
+# shift through `_LANE` zero bytes as xor of tables of the 4 bytes of the register
+_SHIFT_TABLES = []
+for _shift in range(0, 32, 8):
+    _columns = [_crc32c_update(1 << (_shift + _bit), bytes(_LANE)) for _bit in range(8)]
+    _table = [0] * 256
+    for _value in range(1, 256):
+        _low = _value & -_value
+        _table[_value] = _table[_value ^ _low] ^ _columns[_low.bit_length() - 1]
+    _SHIFT_TABLES.append(_table)
+
+
+def _crc32c_lanes(crc, data):
+    lanes = len(data) // _LANE
+    # byte j of every lane in row j
+    columns = np.frombuffer(data, dtype=np.uint8, count=lanes * _LANE).reshape(lanes, _LANE).T.astype(np.uint32)
+    registers = np.zeros(lanes, dtype=np.uint32)
+    for column in columns:
+        registers = _CRC32C_TABLE_NP[(registers ^ column) & 0xFF] ^ (registers >> 8)
+    t0, t1, t2, t3 = _SHIFT_TABLES
+    for register in registers.tolist():
+        crc = t0[crc & 0xFF] ^ t1[(crc >> 8) & 0xFF] ^ t2[(crc >> 16) & 0xFF] ^ t3[crc >> 24] ^ register
+    return _crc32c_update(crc, memoryview(data)[lanes * _LANE:])
+
+
+def crc32c(data):
+    """
+    CRC-32C (Castagnoli) checksum, from the `crc32c` package when it is installed.
+    :param data: bytes
+    :return: int
+    """
+    if _crc32c is not None:
+        return _crc32c(data)
+    if len(data) < 4 * _LANE:
+        return _crc32c_update(_UINT32, data) ^ _UINT32
+    return _crc32c_lanes(_UINT32, data) ^ _UINT32
+
+
+def masked_crc32c(data):
+    crc = crc32c(data)
+    return (((crc >> 15) | (crc << 17)) + _MASK_DELTA) & _UINT32
+
+
+def _varint(value):
+    # negative int64 are encoded as their 64-bit two's complement
+    value &= 0xFFFFFFFFFFFFFFFF
+    out = bytearray()
+    while value > 0x7F:
+        out.append(value & 0x7F | 0x80)
+        value >>= 7
+    out.append(value)
+    return bytes(out)
+
+
+def _field(number, payload):
+    # length-delimited field: key, length, payload
+    return _varint(number << 3 | 2) + _varint(len(payload)) + payload
+
 
 def int64_feature(value):
-  return tf.train.Feature(int64_list=tf.train.Int64List(value=[value]))
+    return int64_list_feature([value])
 
 
 def int64_list_feature(value):
-  return tf.train.Feature(int64_list=tf.train.Int64List(value=value))
+    packed = b"".join(_varint(int(v)) for v in value)
+    return _field(3, _field(1, packed) if packed else b"")
 
 
 def bytes_feature(value):
-  return tf.train.Feature(bytes_list=tf.train.BytesList(value=[value]))
+    return bytes_list_feature([value])
 
 
 def bytes_list_feature(value):
-  return tf.train.Feature(bytes_list=tf.train.BytesList(value=value))
+    return _field(1, b"".join(_field(1, v) for v in value))
 
 
 def float_list_feature(value):
-  return tf.train.Feature(float_list=tf.train.FloatList(value=value))
\ No newline at end of file
+    packed = struct.pack("<%df" % len(value), *value)
+    return _field(2, _field(1, packed) if packed else b"")
+
+
+def example(features):
+    """
+    Serialized `tf.train.Example`.
+    :param features: dict of name: serialized feature made by one of the `*_feature` functions
+    :return: bytes
+    """
+    entries = (_field(1, _field(1, key.encode("utf8")) + _field(2, features[key])) for key in sorted(features))
+    return _field(1, b"".join(entries))
+
+
+def _read_varint(data, pos):
+    value = shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7F) << shift
+        shift += 7
+        if byte < 0x80:
+            return value, pos
+
+
+def _fields(data):
+    # (number, payload) of every field of a serialized message, payload of varint is int
+    pos, end = 0, len(data)
+    while pos < end:
+        key, pos = _read_varint(data, pos)
+        number, wire_type = key >> 3, key & 7
+        if wire_type == 0:
+            value, pos = _read_varint(data, pos)
+        elif wire_type == 1:
+            value, pos = data[pos:pos + 8], pos + 8
+        elif wire_type == 2:
+            length, pos = _read_varint(data, pos)
+            value, pos = data[pos:pos + length], pos + length
+        elif wire_type == 5:
+            value, pos = data[pos:pos + 4], pos + 4
+        else:
+            raise ValueError("Unsupported wire type {}".format(wire_type))
+        yield number, value
+
+
+def _int64(value):
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+
+def parse_feature(feature):
+    """
+    :param feature: serialized `tf.train.Feature`
+    :return: list of bytes, floats or ints
+    """
+    for kind, values in _fields(feature):
+        if kind == 1:
+            return [value for number, value in _fields(values) if number == 1]
+        result = []
+        for number, value in _fields(values):
+            if number != 1:
+                continue
+            if kind == 2:
+                # packed or single float
+                result += struct.unpack("<%df" % (len(value) // 4), value)
+            elif isinstance(value, int):
+                result.append(_int64(value))
+            else:
+                pos = 0
+                while pos < len(value):
+                    item, pos = _read_varint(value, pos)
+                    result.append(_int64(item))
+        return result
+    return []
+
+
+def parse_example(record):
+    """
+    :param record: serialized `tf.train.Example`
+    :return: dict of name: list of values, see `parse_feature`
+    """
+    features = {}
+    for number, value in _fields(record):
+        if number != 1:
+            continue
+        for number, entry in _fields(value):
+            if number != 1:
+                continue
+            key, feature = "", b""
+            for entry_number, entry_value in _fields(entry):
+                if entry_number == 1:
+                    key = entry_value.decode("utf8")
+                elif entry_number == 2:
+                    feature = entry_value
+            features[key] = parse_feature(feature)
+    return features
+
+
+def frame(record):
+    """
+    Record as stored in a TFRecord file: length as uint64, masked CRC-32C of the length,
+    data and masked CRC-32C of the data, all little-endian.
+    :param record: bytes
+    :return: bytes
+    """
+    length = struct.pack("<Q", len(record))
+    return b"".join((length, struct.pack("<I", masked_crc32c(length)),
+                     record, struct.pack("<I", masked_crc32c(record))))
+
+
+class TFRecordWriter(object):
+    """
+    Writes records as `tf.io.TFRecordWriter` does, see `frame`.
+    """
+
+    def __init__(self, path):
+        self.file = open(path, "wb")
+
+    def write(self, record):
+        self.file.write(frame(record))
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def read_records(path, check_crc=False, buffer_size=1 << 22):
+    """
+    Iterate over records of a TFRecord file, reading it sequentially in large blocks.
+    :param path: path to TFRecord file
+    :param check_crc: verify checksums, faster with the `crc32c` package
+    :param buffer_size: size of read buffer
+    :return: generator of bytes
+    """
+    with open(path, "rb", buffering=buffer_size) as file:
+        while True:
+            header = file.read(12)
+            if not header:
+                return
+            if len(header) < 12:
+                raise IOError("Truncated record in {}".format(path))
+            length, length_crc = struct.unpack("<QI", header)
+            data = file.read(length + 4)
+            if len(data) < length + 4:
+                raise IOError("Truncated record in {}".format(path))
+            record = data[:length]
+            if check_crc and (masked_crc32c(header[:8]) != length_crc or
+                              masked_crc32c(record) != struct.unpack("<I", data[length:])[0]):
+                raise IOError("Corrupted record in {}".format(path))
+            yield record
+
+
+def shard_paths(path, shards):
+    """
+    :param path: path of the single output file, e.g. "out/data.record"
+    :param shards: number of shards
+    :return: [path] for one shard, otherwise ["out/data-00000-of-00004.record", ...]
+    """
+    if shards == 1:
+        return [path]
+    root, extension = os.path.splitext(path)
+    return ["{}-{:05d}-of-{:05d}{}".format(root, i, shards, extension) for i in range(shards)]
+
+
+def _framed(encode, item):
+    return frame(encode(item))
+
+
+def write_sharded(encode, items, path, shards=1, workers=None, ordered=True):
+    """
+    Encode items in a process pool and write the records round-robin into shards.
+    Workers also compute the checksums, the main process only writes.
+    :param encode: picklable function from an item to a serialized record
+    :param items: list of items, e.g. annotation files
+    :param path: output path, see `shard_paths`
+    :param shards: number of shards
+    :param workers: number of processes, None for the number of CPUs, 0 to encode in this process
+    :param ordered: keep order of items, k-th record goes to shard k % shards;
+                    otherwise records are written as soon as they are ready
+    :return: list of shard paths
+    """
+    paths = shard_paths(path, shards)
+    encode = partial(_framed, encode)
+    start = time.time()
+    with ExitStack() as stack:
+        files = [stack.enter_context(open(shard, "wb")) for shard in paths]
+        if workers == 0:
+            records = map(encode, items)
+        else:
+            executor = stack.enter_context(ProcessPoolExecutor(workers))
+            if ordered:
+                records = executor.map(encode, items)
+            else:
+                records = (future.result() for future in as_completed([executor.submit(encode, item)
+                                                                       for item in items]))
+        for i, record in enumerate(tqdm(records, total=len(items))):
+            files[i % shards].write(record)
+    elapsed = time.time() - start
+    print("{} pages in {:.1f} s, {:.2f} pages/s".format(len(items), elapsed, len(items) / max(elapsed, 1e-9)))
+    return paths